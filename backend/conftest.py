@@ -0,0 +1,35 @@
+import tempfile
+
+import pytest
+from django.db import transaction
+from django.test import override_settings
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup(
+        'foodgram', 'Размер данных для бенчмарков API (benchmarks/)'
+    )
+    from api.benchmark import SEED_DEFAULTS
+
+    for name, default in SEED_DEFAULTS.items():
+        group.addoption(f'--bench-{name.replace("_", "-")}', type=int,
+                        dest=f'bench_{name}', default=default)
+    group.addoption('--bench-seed', type=int, dest='bench_seed', default=0)
+
+
+@pytest.fixture(scope='module')
+def bench_data(request, django_db_setup, django_db_blocker):
+    """ Засевает тестовую базу данными размера --bench-* на время
+    модуля и откатывает их после.
+    """
+    from api.benchmark import SEED_DEFAULTS, seed
+
+    sizes = {name: request.config.getoption(f'bench_{name}')
+             for name in SEED_DEFAULTS}
+    with django_db_blocker.unblock(), \
+            tempfile.TemporaryDirectory() as media_root, \
+            override_settings(MEDIA_ROOT=media_root), \
+            transaction.atomic():
+        seed(seed=request.config.getoption('bench_seed'), **sizes)
+        yield sizes
+        transaction.set_rollback(True)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db import connection
 
 from .models import (
     AmountOfIngredient,
@@ -6,8 +7,10 @@ from .models import (
     Ingredient,
     Recipe,
     ShoppingCart,
+    ShoppingCartTotal,
     Tag,
 )
+from .search import search_recipes
 
 
 class AmountOfIngredientInlineAdmin(admin.TabularInline):
@@ -19,11 +22,17 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = [
         AmountOfIngredientInlineAdmin,
     ]
-    list_display = ('pk', 'author', 'name')
+    list_display = ('pk', 'author', 'name', 'favorites_count')
     list_filter = ('author', 'name', 'tags')
     search_fields = ('name', )
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """ Поиск по поисковому индексу рецептов вместо ILIKE. """
+        if not search_term.strip():
+            return queryset, False
+        return search_recipes(queryset, search_term, connection), False
+
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -48,6 +57,13 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+@admin.register(ShoppingCartTotal)
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    list_filter = ('user', )
+    empty_value_display = '-пусто-'
+
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'slug')
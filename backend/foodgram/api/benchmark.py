@@ -0,0 +1,312 @@
+import base64
+import json
+import random
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from .counters import reconcile_counters
+from .models import (
+    AmountOfIngredient,
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from .search import update_search_vectors
+from users.models import Follow
+
+User = get_user_model()
+
+SEED_DEFAULTS = {
+    'users': 200,
+    'recipes': 5000,
+    'ingredients': 2000,
+    'tags': 20,
+    'ingredients_per_recipe': 8,
+    'tags_per_recipe': 3,
+    'favorites_per_user': 30,
+    'carts_per_user': 5,
+    'follows_per_user': 10,
+}
+
+ScenarioContext = namedtuple(
+    'ScenarioContext', 'author tags tag_ids ingredients recipe image'
+)
+
+
+@contextmanager
+def benchmark_database(keepdb=False, verbosity=0):
+    """ Создаёт отдельную тестовую базу (как manage.py test),
+    чтобы замеры не трогали рабочие данные, и удаляет её после.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, keepdb=keepdb
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity, keepdb)
+
+
+@contextmanager
+def explicit_pub_date():
+    """ Отключает auto_now_add, чтобы у сгенерированных рецептов
+    были разные даты публикации.
+    """
+    field = Recipe._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _bulk_create(model, objects, batch_size):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _pairs(left_ids, right_ids, per_left, rnd, exclude_self=False):
+    for left in left_ids:
+        choices = rnd.sample(right_ids, min(per_left, len(right_ids)))
+        for right in choices:
+            if exclude_self and left == right:
+                continue
+            yield left, right
+
+
+def seed(seed=0, batch_size=2000, **options):
+    """ Наполняет базу синтетическими данными заданного размера.
+    Возвращает словарь с id созданных объектов.
+    """
+    sizes = {**SEED_DEFAULTS, **{
+        key: value for key, value in options.items() if value is not None
+    }}
+    rnd = random.Random(seed)
+    password = make_password(None)
+
+    _bulk_create(User, (
+        User(username=f'bench{index}', email=f'bench{index}@foodgram.ru',
+             first_name='Bench', last_name=str(index), password=password)
+        for index in range(sizes['users'])
+    ), batch_size)
+    user_ids = list(User.objects.filter(
+        username__startswith='bench'
+    ).values_list('id', flat=True))
+
+    _bulk_create(Tag, (
+        Tag(name=f'Тег {index}', slug=f'bench-tag-{index}',
+            color=f'#{index:06X}')
+        for index in range(sizes['tags'])
+    ), batch_size)
+    tag_ids = list(Tag.objects.filter(
+        slug__startswith='bench-tag-'
+    ).values_list('id', flat=True))
+
+    _bulk_create(Ingredient, (
+        Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+        for index in range(sizes['ingredients'])
+    ), batch_size)
+    ingredient_ids = list(Ingredient.objects.filter(
+        name__startswith='ингредиент '
+    ).values_list('id', flat=True))
+
+    now = timezone.now()
+    with explicit_pub_date():
+        _bulk_create(Recipe, (
+            Recipe(author_id=rnd.choice(user_ids), name=f'Рецепт {index}',
+                   text=f'Описание рецепта {index}', cooking_time=10,
+                   image='recipes/images/bench.png',
+                   pub_date=now - timedelta(minutes=index))
+            for index in range(sizes['recipes'])
+        ), batch_size)
+    recipe_ids = list(Recipe.objects.filter(
+        image='recipes/images/bench.png'
+    ).values_list('id', flat=True))
+
+    _bulk_create(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id, tag_id in _pairs(
+            recipe_ids, tag_ids, sizes['tags_per_recipe'], rnd
+        )
+    ), batch_size)
+    _bulk_create(AmountOfIngredient, (
+        AmountOfIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                           amount=rnd.randint(1, 500))
+        for recipe_id, ingredient_id in _pairs(
+            recipe_ids, ingredient_ids, sizes['ingredients_per_recipe'], rnd
+        )
+    ), batch_size)
+    _bulk_create(Favorite, (
+        Favorite(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in _pairs(
+            user_ids, recipe_ids, sizes['favorites_per_user'], rnd
+        )
+    ), batch_size)
+    _bulk_create(ShoppingCart, (
+        ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in _pairs(
+            user_ids, recipe_ids, sizes['carts_per_user'], rnd
+        )
+    ), batch_size)
+    _bulk_create(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in _pairs(
+            user_ids, user_ids, sizes['follows_per_user'], rnd,
+            exclude_self=True
+        )
+    ), batch_size)
+    call_command('rebuild_shopping_cart_totals', stdout=StringIO())
+    reconcile_counters()
+    update_search_vectors()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    return {
+        'users': user_ids,
+        'tags': tag_ids,
+        'ingredients': ingredient_ids,
+        'recipes': recipe_ids,
+    }
+
+
+def timeit(function, runs):
+    """ Время выполнения function в миллисекундах для каждого запуска. """
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def png_base64():
+    buffer = BytesIO()
+    Image.new('RGB', (32, 32), 'orange').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def _recipe_data(context):
+    def data(index):
+        return {
+            'name': f'Бенчмарк {index}',
+            'text': 'Рецепт для замеров',
+            'cooking_time': 10 + index % 5,
+            'tags': context.tag_ids[:2],
+            'image': context.image,
+            'ingredients': [
+                {'id': ingredient, 'amount': 10 + index % 7}
+                for ingredient in context.ingredients[index % 3:index % 3 + 5]
+            ],
+        }
+    return data
+
+
+# Сценарии: имя -> функция от ScenarioContext, которая возвращает
+# (метод, путь, функция от номера запуска с телом запроса или None).
+SCENARIOS = {
+    'recipes: list': lambda context: ('get', '/api/recipes/', None),
+    'recipes: list cursor': lambda context: (
+        'get', '/api/recipes/?cursor=&limit=6', None
+    ),
+    'recipes: author': lambda context: (
+        'get', f'/api/recipes/?author={context.author.id}', None
+    ),
+    'recipes: tags': lambda context: (
+        'get', '/api/recipes/?' + '&'.join(
+            f'tags={slug}' for slug in context.tags[:2]
+        ), None
+    ),
+    'recipes: is_favorited': lambda context: (
+        'get', '/api/recipes/?is_favorited=1', None
+    ),
+    'recipes: is_in_shopping_cart': lambda context: (
+        'get', '/api/recipes/?is_in_shopping_cart=1', None
+    ),
+    'recipes: detail': lambda context: (
+        'get', f'/api/recipes/{context.recipe.id}/', None
+    ),
+    'ingredients: search': lambda context: (
+        'get', '/api/ingredients/?name=ингредиент 1', None
+    ),
+    'users: subscriptions': lambda context: (
+        'get', '/api/users/subscriptions/?recipes_limit=3', None
+    ),
+    'recipes: download_shopping_cart': lambda context: (
+        'get', '/api/recipes/download_shopping_cart/', None
+    ),
+    'recipes: create': lambda context: (
+        'post', '/api/recipes/', _recipe_data(context)
+    ),
+    'recipes: update': lambda context: (
+        'patch', f'/api/recipes/{context.recipe.id}/',
+        _recipe_data(context)
+    ),
+}
+
+
+def scenario_client():
+    """ Клиент от имени пользователя с рецептами, списком покупок
+    и подписками и данные для сценариев из засеянной базы.
+    """
+    user = User.objects.filter(
+        recipe_author__isnull=False,
+        shopping_cart_user__isnull=False,
+        follower__isnull=False,
+    ).distinct().first()
+    author = User.objects.filter(
+        recipe_author__isnull=False
+    ).exclude(id=user.id).first() or user
+    context = ScenarioContext(
+        author=author,
+        tags=list(Tag.objects.values_list('slug', flat=True)),
+        tag_ids=list(Tag.objects.values_list('id', flat=True)),
+        ingredients=list(Ingredient.objects.values_list(
+            'id', flat=True
+        )[:10]),
+        recipe=Recipe.objects.filter(author=user).first(),
+        image=png_base64(),
+    )
+    token, _ = Token.objects.get_or_create(user=user)
+    return Client(HTTP_AUTHORIZATION=f'Token {token.key}'), context
+
+
+def send(client, method, path, data, index):
+    """ Запрос сценария; потоковый ответ читается целиком. """
+    kwargs = {}
+    if data is not None:
+        kwargs = {'data': json.dumps(data(index)),
+                  'content_type': 'application/json'}
+    response = getattr(client, method)(path, **kwargs)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
@@ -0,0 +1,120 @@
+from hashlib import sha1
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+VERSION_KEY = 'foodgram:{}:version'
+RESPONSE_KEY = 'foodgram:response:{}'
+RESPONSE_VERSION_KEY = 'foodgram:response:version:{}'
+RESPONSE_EPOCH = 'epoch'
+
+_rendered = {}
+
+
+def version_cache():
+    """ Кэш версий VERSION_CACHE_ALIAS, общий для всех процессов:
+    смену версии из команды (docker exec) или другого воркера видят
+    все. Пропавшая версия создаётся заново, то есть тоже меняется.
+    """
+    return caches[settings.VERSION_CACHE_ALIAS]
+
+
+def get_version(name):
+    """ Текущая версия набора данных name. """
+    backend = version_cache()
+    key = VERSION_KEY.format(name)
+    version = backend.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not backend.add(key, version, timeout=None):
+            version = backend.get(key, version)
+    return version
+
+
+def bump_version(name):
+    version = uuid4().hex
+    version_cache().set(VERSION_KEY.format(name), version, timeout=None)
+    return version
+
+
+def get_rendered(name, render):
+    """ Отрендеренное представление набора данных name и его ETag.
+    Хранится в памяти процесса и пересчитывается при смене версии.
+    """
+    version = get_version(name)
+    entry = _rendered.get(name)
+    if entry is None or entry[0] != version:
+        body = render()
+        entry = (version, body, f'"{sha1(body).hexdigest()}"')
+        _rendered[name] = entry
+    return entry[1], entry[2]
+
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def response_key(request):
+    """ Ключ ответа: адрес без пустых параметров, параметры
+    отсортированы, поэтому ?tags=b&tags=a и ?tags=a&tags=b совпадают.
+    """
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+        if value
+    )
+    url = f'{request.scheme}://{request.get_host()}{request.path}'
+    return RESPONSE_KEY.format(sha1(
+        f'{url}?{urlencode(params)}'.encode()
+    ).hexdigest())
+
+
+def get_response_versions(names, create=False):
+    """ Версии зависимостей ответов. Отсутствующие версии создаются
+    при create=True, иначе возвращаются как None. Хранятся вместе
+    с ответами: их много, и общий кэш версий для них слишком медленный.
+    """
+    backend = response_cache()
+    keys = {RESPONSE_VERSION_KEY.format(name): name for name in names}
+    found = backend.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, name in keys.items():
+        if name in versions or not create:
+            continue
+        version = uuid4().hex
+        if not backend.add(key, version, timeout=None):
+            version = backend.get(key, version)
+        versions[name] = version
+    return versions
+
+
+def invalidate_responses(*names):
+    """ Делает недействительными ответы, зависящие от names. """
+    response_cache().set_many({
+        RESPONSE_VERSION_KEY.format(name): uuid4().hex for name in names
+    }, timeout=None)
+
+
+def get_response(key):
+    entry = response_cache().get(key)
+    if entry is None:
+        return None
+    versions, body = entry
+    if get_response_versions(versions) != versions:
+        return None
+    return body
+
+
+def store_response(key, body, versions, dependencies):
+    """ Сохраняет ответ с версиями зависимостей. versions прочитаны
+    до построения ответа, чтобы изменение во время рендеринга
+    не попало в кэш под новой версией.
+    """
+    versions = {
+        **get_response_versions(dependencies, create=True),
+        **versions,
+    }
+    response_cache().set(key, (versions, body))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+PROCESS_LOCAL_VERSIONS = (
+    'Кэш версий {} хранит данные в памяти процесса: смена версии '
+    'не дойдёт до других воркеров и команд manage.py'
+)
+
+
+@register(Tags.caches)
+def check_version_cache(app_configs, **kwargs):
+    """ Версии должны храниться в общем для процессов кэше
+    (база данных, memcached), иначе кэши и индексы процессов
+    не узнают об изменениях.
+    """
+    alias = settings.VERSION_CACHE_ALIAS
+    if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [Error(PROCESS_LOCAL_VERSIONS.format(alias), id='api.E001')]
+    return []
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AmountOfIngredient, Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+# (модель со счётчиком, поле счётчика, считаемая модель, ссылка на неё)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (Recipe, 'ingredients_count', AmountOfIngredient, 'recipe'),
+    (User, 'followers_count', Follow, 'author'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """ Атомарно меняет счётчик на delta одним UPDATE без чтения
+    строки; значение не опускается ниже нуля.
+    """
+    if not delta:
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def actual_count(counted_model, link):
+    """ Подзапрос с точным числом строк counted_model,
+    ссылающихся на внешнюю строку через link.
+    """
+    return Coalesce(Subquery(
+        counted_model.objects.filter(
+            **{link: OuterRef('pk')}
+        ).order_by().values(link).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), Value(0))
+
+
+def reconcile_counters(dry_run=False):
+    """ Находит строки, где счётчик разошёлся с данными, и при
+    dry_run=False исправляет их одним UPDATE на счётчик.
+    Возвращает {'модель.поле': число расхождений}.
+    """
+    drift = {}
+    for model, field, counted_model, link in COUNTERS:
+        actual = actual_count(counted_model, link)
+        stale = model.objects.exclude(**{field: actual})
+        if dry_run:
+            rows = stale.count()
+        else:
+            rows = stale.update(**{field: actual})
+        drift[f'{model._meta.label_lower}.{field}'] = rows
+    return drift
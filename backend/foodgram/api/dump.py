@@ -0,0 +1,247 @@
+import datetime
+import json
+import os
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .cache import bump_version
+from .counters import reconcile_counters
+from .feed import rebuild_feeds
+from .importers import chunks
+from .models import (
+    AmountOfIngredient,
+    Favorite,
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShoppingCartTotal,
+    Tag,
+)
+from .search import (
+    is_postgresql,
+    log_recipe_ingredient_changes,
+    update_search_vectors,
+)
+from users.models import Follow, User
+
+MANIFEST = 'manifest.json'
+FORMATS = ('ndjson', 'copy')
+# Поля, которые вычисляются заново при загрузке.
+COMPUTED_FIELDS = ('search_vector',)
+UNKNOWN_MODEL = 'Неизвестная модель в дампе: {}'
+COPY_NEEDS_POSTGRESQL = 'Формат copy доступен только для PostgreSQL'
+
+# Порядок важен: каждая модель идёт после тех, на кого ссылается.
+DUMP_MODELS = (
+    User,
+    Tag,
+    Ingredient,
+    Recipe,
+    Recipe.tags.through,
+    AmountOfIngredient,
+    Favorite,
+    ShoppingCart,
+    Follow,
+)
+
+
+class DumpEncoder(DjangoJSONEncoder):
+    """ Сохраняет даты с микросекундами: DjangoJSONEncoder
+    обрезает их до миллисекунд.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if field.name not in COMPUTED_FIELDS
+    ]
+
+
+def _columns(model):
+    return [field.column for field in _fields(model)]
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+@contextmanager
+def _explicit_dates(model):
+    """ Отключает auto_now и auto_now_add, чтобы bulk_create
+    сохранил даты из дампа.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _export_ndjson(model, path, chunk_size):
+    columns = [field.attname for field in _fields(model)]
+    rows = model.objects.order_by('pk').values_list(*columns)
+    count = 0
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(json.dumps({'columns': columns}) + '\n')
+        for row in rows.iterator(chunk_size=chunk_size):
+            file.write(json.dumps(
+                row, cls=DumpEncoder, ensure_ascii=False
+            ) + '\n')
+            count += 1
+    return count
+
+
+def _export_copy(model, path):
+    columns = ', '.join(_columns(model))
+    pk = model._meta.pk.column
+    with open(path, 'w', encoding='utf-8') as file, \
+            connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY (SELECT {columns} FROM {_table(model)} ORDER BY {pk}) '
+            f'TO STDOUT WITH (FORMAT csv, HEADER)', file
+        )
+        return cursor.rowcount
+
+
+def export_dataset(directory, file_format='ndjson', chunk_size=5000):
+    """ Выгружает данные в directory: по файлу на модель
+    и manifest.json с порядком загрузки. Строки читаются
+    курсором, поэтому расход памяти не зависит от объёма базы.
+    """
+    if file_format == 'copy' and not is_postgresql(connection):
+        raise ValueError(COPY_NEEDS_POSTGRESQL)
+    os.makedirs(directory, exist_ok=True)
+    entries = []
+    with transaction.atomic():
+        if is_postgresql(connection):
+            # Один снимок данных на все таблицы.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ'
+                )
+        for model in DUMP_MODELS:
+            extension = 'csv' if file_format == 'copy' else 'ndjson'
+            name = f'{_label(model)}.{extension}'
+            path = os.path.join(directory, name)
+            if file_format == 'copy':
+                rows = _export_copy(model, path)
+            else:
+                rows = _export_ndjson(model, path, chunk_size)
+            entries.append({'model': _label(model), 'file': name,
+                            'rows': rows})
+    with open(os.path.join(directory, MANIFEST), 'w') as file:
+        json.dump({'format': file_format, 'models': entries}, file,
+                  indent=2)
+    return entries
+
+
+def _import_ndjson(model, path, chunk_size):
+    count = 0
+    with open(path, encoding='utf-8') as file, _explicit_dates(model):
+        columns = json.loads(file.readline())['columns']
+        for chunk in chunks(file, chunk_size):
+            model.objects.bulk_create(
+                model(**dict(zip(columns, json.loads(line))))
+                for line in chunk
+            )
+            count += len(chunk)
+    return count
+
+
+def _import_copy(model, path):
+    with open(path, encoding='utf-8') as file, \
+            connection.cursor() as cursor:
+        columns = file.readline().strip()
+        file.seek(0)
+        cursor.copy_expert(
+            f'COPY {_table(model)} ({columns}) '
+            f'FROM STDIN WITH (FORMAT csv, HEADER)', file
+        )
+        return cursor.rowcount
+
+
+def flush_dataset():
+    """ Удаляет данные всех выгружаемых моделей и производных от них. """
+    models = (ShoppingCartTotal, FeedEntry, *reversed(DUMP_MODELS))
+    if is_postgresql(connection):
+        tables = [model._meta.db_table for model in models]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sql_flush(
+                no_style(), tables, (), allow_cascade=True
+            ):
+                cursor.execute(sql)
+        return
+    for model in models:
+        model.objects.all().delete()
+
+
+def _bump_versions():
+    bump_version('ingredients')
+    bump_version('tags')
+    log_recipe_ingredient_changes(None)
+
+
+@transaction.atomic
+def import_dataset(directory, chunk_size=5000, flush=False):
+    """ Загружает дамп из directory в порядке manifest.json,
+    сбрасывает последовательности первичных ключей и
+    пересчитывает итоги списков покупок, счётчики, ленты подписчиков
+    и поисковый индекс.
+    """
+    with open(os.path.join(directory, MANIFEST)) as file:
+        manifest = json.load(file)
+    models = {_label(model): model for model in DUMP_MODELS}
+    if manifest['format'] == 'copy' and not is_postgresql(connection):
+        raise ValueError(COPY_NEEDS_POSTGRESQL)
+    if flush:
+        flush_dataset()
+
+    entries = []
+    for entry in manifest['models']:
+        model = models.get(entry['model'])
+        if model is None:
+            raise ValueError(UNKNOWN_MODEL.format(entry['model']))
+        path = os.path.join(directory, entry['file'])
+        if manifest['format'] == 'copy':
+            rows = _import_copy(model, path)
+        else:
+            rows = _import_ndjson(model, path, chunk_size)
+        entries.append({'model': entry['model'], 'rows': rows})
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(), DUMP_MODELS
+        ):
+            cursor.execute(sql)
+        if is_postgresql(connection):
+            cursor.execute('ANALYZE')
+    call_command('rebuild_shopping_cart_totals', stdout=StringIO())
+    reconcile_counters()
+    rebuild_feeds()
+    update_search_vectors()
+    transaction.on_commit(_bump_versions)
+    return entries
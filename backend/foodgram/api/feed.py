@@ -0,0 +1,149 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from .importers import chunks
+from .models import FeedEntry, Recipe
+from users.models import Follow
+
+User = get_user_model()
+
+
+def _fan_out(user_ids, recipes):
+    """ Раскладывает recipes по лентам user_ids пачками
+    и обрезает ленты до FEED_RETENTION записей.
+    """
+    for batch in chunks(user_ids, settings.FEED_FANOUT_BATCH_SIZE):
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                      pub_date=recipe.pub_date)
+            for user_id in batch
+            for recipe in recipes
+        ], ignore_conflicts=True)
+        FeedEntry.objects.trim(batch, settings.FEED_RETENTION)
+
+
+def _latest_recipes(author_id):
+    return list(Recipe.objects.filter(author_id=author_id).only(
+        'id', 'pub_date'
+    ).order_by('-pub_date', '-id')[:settings.FEED_BACKFILL])
+
+
+def fan_out_recipe(recipe_id):
+    """ Добавляет новый рецепт в ленты подписчиков автора.
+    Если подписчиков больше FEED_PULL_FOLLOWERS, автор переводится
+    в режим чтения напрямую (feed_pull), и рецепт не рассылается.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).select_related(
+        'author'
+    ).only(
+        'id', 'pub_date', 'author__feed_pull', 'author__followers_count'
+    ).first()
+    if recipe is None:
+        return
+    author = recipe.author
+    pull = author.followers_count > settings.FEED_PULL_FOLLOWERS
+    if pull != author.feed_pull:
+        User.objects.filter(pk=author.pk).update(feed_pull=pull)
+    if pull:
+        return
+    follower_ids = Follow.objects.filter(author=author).values_list(
+        'user_id', flat=True
+    ).iterator()
+    if author.feed_pull:
+        # Рецепты автора читались напрямую: переносим в ленты и прежние.
+        _fan_out(follower_ids, _latest_recipes(author.pk))
+    else:
+        _fan_out(follower_ids, [recipe])
+
+
+def _following(user_id, author_id):
+    return Follow.objects.filter(user_id=user_id, author_id=author_id)
+
+
+def add_author_to_feed(user_id, author_id):
+    """ После подписки добавляет в ленту последние рецепты автора.
+    Выполняется в фоне и может разминуться с отпиской: подписка
+    проверяется до вставки и после неё, а remove_author_from_feed
+    запускается после коммита отписки, так что одна из сторон
+    всегда видит результат другой.
+    """
+    if (User.objects.filter(pk=author_id, feed_pull=True).exists()
+            or not _following(user_id, author_id).exists()):
+        return
+    _fan_out([user_id], _latest_recipes(author_id))
+    if not _following(user_id, author_id).exists():
+        remove_author_from_feed(user_id, author_id)
+
+
+def remove_author_from_feed(user_id, author_id):
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def rebuild_feeds():
+    """ Строит ленты заново по подпискам и числу подписчиков,
+    например после загрузки дампа: каждому автору без feed_pull
+    его последние рецепты раскладываются по лентам подписчиков.
+    """
+    FeedEntry.objects.all().delete()
+    User.objects.filter(
+        followers_count__gt=settings.FEED_PULL_FOLLOWERS
+    ).update(feed_pull=True)
+    User.objects.filter(
+        followers_count__lte=settings.FEED_PULL_FOLLOWERS
+    ).update(feed_pull=False)
+    author_ids = list(Follow.objects.filter(
+        author__feed_pull=False
+    ).order_by().values_list('author_id', flat=True).distinct())
+    for author_id in author_ids:
+        _fan_out(
+            list(Follow.objects.filter(author_id=author_id).values_list(
+                'user_id', flat=True
+            )),
+            _latest_recipes(author_id),
+        )
+
+
+def _after(queryset, position, id_field):
+    if position is None:
+        return queryset
+    pub_date, pk = position
+    return queryset.filter(
+        Q(pub_date__lt=pub_date)
+        | Q(pub_date=pub_date, **{f'{id_field}__lt': pk})
+    )
+
+
+def read_feed(user, position, limit):
+    """ Ключи (pub_date, id) не более limit рецептов ленты user,
+    следующих за position. Записи FeedEntry читаются по индексу
+    (user, -pub_date), рецепты авторов с feed_pull, которые
+    не рассылаются, — отдельно по (author, -pub_date);
+    обе выборки сливаются по дате.
+    """
+    keys = list(_after(
+        FeedEntry.objects.filter(user=user), position, 'recipe_id'
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit])
+    pull_author_ids = list(Follow.objects.filter(
+        user=user, author__feed_pull=True
+    ).order_by().values_list('author_id', flat=True))
+    if not pull_author_ids:
+        return keys
+    pulled = _after(
+        Recipe.objects.filter(author_id__in=pull_author_ids), position, 'id'
+    ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:limit]
+    # Записи, разосланные до перевода автора в feed_pull, дублируют
+    # его рецепты из второй выборки.
+    seen = set()
+    merged = (
+        key for key in heapq.merge(keys, list(pulled), reverse=True)
+        if key[1] not in seen and not seen.add(key[1])
+    )
+    return list(islice(merged, limit))
@@ -0,0 +1,105 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+IMAGE_TOO_LARGE = 'Картинка больше {} байт'
+TOO_MANY_PIXELS = 'Картинка больше {} пикселей'
+
+
+class PrimaryKeyListField(serializers.ManyRelatedField):
+    """ Список id объектов, которые читаются одним запросом,
+    а не запросом на каждый id, как у PrimaryKeyRelatedField(many=True).
+    """
+
+    def __init__(self, queryset, **kwargs):
+        super().__init__(
+            child_relation=serializers.PrimaryKeyRelatedField(
+                queryset=queryset
+            ),
+            **kwargs
+        )
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        queryset = self.child_relation.get_queryset()
+        pk_field = queryset.model._meta.pk
+        try:
+            pks = [pk_field.to_python(pk) for pk in data]
+        except ValidationError:
+            self.child_relation.fail('incorrect_type', data_type='str')
+        objects = queryset.in_bulk(set(pks))
+        for pk in pks:
+            if pk not in objects:
+                self.child_relation.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class ImageVariantField(serializers.ImageField):
+    """ Ссылка на вариант картинки рецепта. Пока вариант
+    не готов, отдаётся ссылка на исходную картинку.
+    """
+
+    def __init__(self, fallback='image', **kwargs):
+        kwargs['read_only'] = True
+        self.fallback = fallback
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return (super().get_attribute(instance)
+                or getattr(instance, self.fallback))
+
+
+class LimitedImageField(Base64ImageField):
+    """ Картинка в base64 или уже загруженный файл (его создаёт
+    RecipeJSONParser или multipart). Размер файла и число пикселей
+    проверяются по заголовку до полной проверки картинки Pillow.
+    """
+
+    def to_internal_value(self, data):
+        max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+        if isinstance(data, str) and len(data) * 3 // 4 > max_bytes:
+            raise serializers.ValidationError(
+                IMAGE_TOO_LARGE.format(max_bytes)
+            )
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        if data.size > max_bytes:
+            raise serializers.ValidationError(
+                IMAGE_TOO_LARGE.format(max_bytes)
+            )
+        extension = self.check_image(data)
+        data.seek(0)
+        data.name = f'{self.get_file_name(data)}.{extension}'
+        return serializers.ImageField.to_internal_value(self, data)
+
+    def get_file_extension(self, filename, decoded_file):
+        self.check_image(decoded_file)
+        return super().get_file_extension(filename, decoded_file)
+
+    def check_image(self, file):
+        """ Читает только заголовок картинки и возвращает расширение. """
+        if isinstance(file, bytes):
+            file = BytesIO(file)
+        try:
+            image = Image.open(file)
+        except (OSError, Image.DecompressionBombError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        width, height = image.size
+        max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+        if width * height > max_pixels:
+            raise serializers.ValidationError(
+                TOO_MANY_PIXELS.format(max_pixels)
+            )
+        extension = (image.format or '').lower()
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        return extension
@@ -1,27 +1,38 @@
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django_filters import rest_framework
+from rest_framework.filters import OrderingFilter
 
 from .models import Ingredient, Recipe, Tag
+from .search import rank_ingredients, search_recipes
 
 User = get_user_model()
 
 
 class IngredientFilter(rest_framework.FilterSet):
-    name = rest_framework.CharFilter(field_name='name',
-                                     lookup_expr='startswith')
+    """ Поиск ингредиентов без учёта регистра: сначала по началу
+    названия, затем по вхождению подстроки.
+    """
+    name = rest_framework.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name', )
 
+    def filter_name(self, queryset, name, value):
+        return rank_ingredients(queryset, value, connection)
+
 
 class RecipeFilter(rest_framework.FilterSet):
-    """ Фильтрация рецептов по избранному, автору, списку покупок и тегам.
+    """ Фильтрация рецептов по избранному, автору, списку покупок и тегам
+    и полнотекстовый поиск ?search= по названию, описанию и ингредиентам.
     """
+    search = rest_framework.CharFilter(method='filter_search')
     tags = rest_framework.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='get_tags',
     )
     is_favorited = rest_framework.BooleanFilter(
         method='get_is_favorited'
@@ -32,7 +43,23 @@ class RecipeFilter(rest_framework.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
+
+    def get_tags(self, queryset, name, value):
+        """ Полусоединение по id__in вместо JOIN с DISTINCT:
+        каждый рецепт попадает в выборку один раз.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(id__in=Recipe.tags.through.objects.filter(
+            tag__in=value
+        ).values('recipe_id'))
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value, connection)
 
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -45,3 +72,16 @@ class RecipeFilter(rest_framework.FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(shopping_cart_recipe__user=user)
         return queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """ Сортировка ?ordering=-favorites_count; при равных значениях
+    рецепты идут от новых к старым.
+    """
+    ordering_fields = ('favorites_count', 'pub_date')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering:
+            ordering = [*ordering, '-pub_date', '-id']
+        return ordering
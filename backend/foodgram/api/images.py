@@ -0,0 +1,64 @@
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from .cache import invalidate_responses
+from .models import Recipe
+
+
+def _encode(image, size, image_format):
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=settings.RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def render_variants(file):
+    """ Уменьшенная копия и WebP-версия картинки:
+    {имя поля: (расширение, содержимое)}. Без поддержки
+    WebP в Pillow создаётся только миниатюра.
+    """
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        thumb_format = 'PNG' if has_alpha else 'JPEG'
+        variants = {'image_thumb': (
+            thumb_format.lower(),
+            _encode(image, settings.RECIPE_THUMB_SIZE, thumb_format),
+        )}
+        if features.check('webp'):
+            variants['image_webp'] = (
+                'webp', _encode(image, settings.RECIPE_WEBP_SIZE, 'WEBP')
+            )
+    return variants
+
+
+def process_recipe_image(recipe_id):
+    """ Создаёт варианты картинки рецепта и сохраняет их,
+    только если картинка не сменилась за время обработки.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    with recipe.image.open('rb') as file:
+        variants = render_variants(file)
+    stem = PurePosixPath(source).stem
+    saved = {}
+    for name, (extension, content) in variants.items():
+        field = Recipe._meta.get_field(name)
+        saved[name] = field.storage.save(
+            field.generate_filename(recipe, f'{stem}.{extension}'),
+            ContentFile(content),
+        )
+    # Если картинку успели сменить, файлы вариантов удалит
+    # collect_media_garbage: с ContentHashStorage они могут
+    # принадлежать и другим рецептам.
+    if Recipe.objects.filter(pk=recipe_id, image=source).update(**saved):
+        invalidate_responses(f'recipe:{recipe_id}')
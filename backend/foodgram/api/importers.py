@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+import re
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .cache import bump_version
+from .models import Ingredient
+from .search import is_postgresql
+
+BUFFER_SIZE = 64 * 1024
+MAX_BUFFER_SIZE = 1024 * 1024
+NOT_AN_ARRAY = 'Ожидается JSON-массив ингредиентов'
+MALFORMED_JSON = 'Некорректный JSON в элементе с байта {}: {}'
+ITEM_TOO_LARGE = ('Элемент JSON-массива с байта {} не разобран '
+                  'в пределах {} символов: {}')
+SEPARATORS = re.compile(r'[\s,]*')
+INGREDIENT_FIELDS = ('name', 'measurement_unit')
+
+
+def read_json(file, buffer_size=BUFFER_SIZE,
+              max_buffer_size=MAX_BUFFER_SIZE):
+    """ Читает JSON-массив объектов по одному элементу,
+    не загружая файл в память целиком. Буфер неразобранного
+    элемента ограничен max_buffer_size символами, ошибки
+    сообщают смещение начала элемента в байтах.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(buffer_size)
+    stripped = buffer.lstrip()
+    offset = len(buffer[:len(buffer) - len(stripped)].encode())
+    buffer = stripped
+    if not buffer.startswith('['):
+        raise ValueError(NOT_AN_ARRAY)
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            start = offset + len(buffer[:position].encode())
+            chunk = file.read(buffer_size)
+            if not chunk:
+                raise ValueError(MALFORMED_JSON.format(start, error.msg))
+            if len(buffer) - position + len(chunk) > max_buffer_size:
+                raise ValueError(
+                    ITEM_TOO_LARGE.format(start, max_buffer_size, error.msg)
+                )
+            buffer = buffer[position:] + chunk
+            offset = start
+            position = 0
+            continue
+        yield item
+
+
+def read_csv(file, fields=INGREDIENT_FIELDS):
+    """ Читает CSV со столбцами fields. Строка заголовка,
+    если она есть, пропускается.
+    """
+    for index, row in enumerate(csv.reader(file)):
+        if index == 0 and tuple(row) == fields:
+            continue
+        yield dict(zip(fields, row))
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def clean_ingredient(row):
+    name = (row.get('name') or '').strip()
+    measurement_unit = (row.get('measurement_unit') or '').strip()
+    if not name or not measurement_unit:
+        return None
+    return name, measurement_unit
+
+
+def _insert_chunk(rows):
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, measurement_unit=measurement_unit)
+         for name, measurement_unit in rows),
+        ignore_conflicts=True,
+    )
+
+
+def _copy_chunk(cursor, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        'COPY ingredient_import (name, measurement_unit) '
+        'FROM STDIN WITH (FORMAT csv)', buffer
+    )
+
+
+@transaction.atomic
+def import_ingredients(rows, chunk_size=5000):
+    """ Загружает ингредиенты пачками в одной транзакции.
+    Уже существующие и некорректные строки пропускаются.
+    На PostgreSQL данные идут через COPY во временную таблицу
+    и INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает пару (добавлено, пропущено).
+    """
+    total = 0
+    before = Ingredient.objects.count()
+    if is_postgresql(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            for chunk in chunks(rows, chunk_size):
+                cleaned = [row for row in map(clean_ingredient, chunk) if row]
+                total += len(chunk)
+                _copy_chunk(cursor, cleaned)
+            cursor.execute(
+                f'INSERT INTO {Ingredient._meta.db_table} '
+                '(name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_import '
+                'ON CONFLICT DO NOTHING'
+            )
+    else:
+        for chunk in chunks(rows, chunk_size):
+            cleaned = [row for row in map(clean_ingredient, chunk) if row]
+            total += len(chunk)
+            _insert_chunk(cleaned)
+    inserted = Ingredient.objects.count() - before
+    transaction.on_commit(lambda: bump_version('ingredients'))
+    return inserted, total - inserted
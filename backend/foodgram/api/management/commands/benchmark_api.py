@@ -0,0 +1,96 @@
+import json
+import tempfile
+import time
+from statistics import mean
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.benchmark import (
+    SCENARIOS,
+    SEED_DEFAULTS,
+    benchmark_database,
+    percentile,
+    scenario_client,
+    seed,
+    send,
+)
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database, drive the main API endpoints '
+            'through the Django test client and print throughput, '
+            'latency percentiles and query counts as JSON.')
+
+    def add_arguments(self, parser):
+        for name, default in SEED_DEFAULTS.items():
+            parser.add_argument(f'--{name.replace("_", "-")}', type=int,
+                                dest=name, default=default)
+        parser.add_argument('--runs', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', nargs='*', default=None,
+                            help='Run only the scenarios with these names.')
+        parser.add_argument('--output', default=None,
+                            help='Write the JSON report to this file.')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def run(self, client, method, path, data, runs, warmup):
+        timings = []
+        queries = []
+        statuses = set()
+        for index in range(warmup + runs):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = send(client, method, path, data, index)
+                elapsed = time.perf_counter() - started
+            if index < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(len(context.captured_queries))
+            statuses.add(response.status_code)
+        total = sum(timings) / 1000
+        return {
+            'runs': runs,
+            'status': sorted(statuses),
+            'throughput_rps': round(runs / total, 2) if total else None,
+            'mean_ms': round(mean(timings), 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries_min': min(queries),
+            'queries_max': max(queries),
+        }
+
+    def handle(self, *args, **options):
+        with benchmark_database(keepdb=options['keepdb']), \
+                tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            sizes = {name: options[name] for name in SEED_DEFAULTS}
+            self.stderr.write(f'Seeding {sizes} on {connection.vendor}...')
+            seed(seed=options['seed'], **sizes)
+            report = {
+                'vendor': connection.vendor,
+                'sizes': sizes,
+                'runs': options['runs'],
+                'results': self.benchmark(options),
+            }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def benchmark(self, options):
+        client, context = scenario_client()
+        results = {}
+        for name, scenario in SCENARIOS.items():
+            if options['only'] and name not in options['only']:
+                continue
+            self.stderr.write(f'{name}...')
+            method, path, data = scenario(context)
+            results[name] = self.run(client, method, path, data,
+                                     options['runs'], options['warmup'])
+        return results
@@ -0,0 +1,89 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from api.benchmark import (
+    SEED_DEFAULTS,
+    benchmark_database,
+    percentile,
+    seed,
+    timeit,
+)
+from api.filters import RecipeFilter
+from api.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database and print EXPLAIN plans and timings '
+            'for RecipeFilter combinations.')
+
+    def add_arguments(self, parser):
+        for name, default in SEED_DEFAULTS.items():
+            parser.add_argument(f'--{name.replace("_", "-")}', type=int,
+                                dest=name, default=default)
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--analyze', action='store_true',
+                            help='Use EXPLAIN ANALYZE (PostgreSQL).')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def combinations(self, user, author, tags):
+        return {
+            'feed': {},
+            'author': {'author': author.id},
+            'tags': {'tags': tags[:1]},
+            'tags x3': {'tags': tags[:3]},
+            'author + tags': {'author': author.id, 'tags': tags[:2]},
+            'is_favorited': {'is_favorited': 1},
+            'is_in_shopping_cart': {'is_in_shopping_cart': 1},
+            'is_favorited + tags': {'is_favorited': 1, 'tags': tags[:2]},
+        }
+
+    def filtered(self, params, user):
+        request = RequestFactory().get('/api/recipes/')
+        request.user = user or AnonymousUser()
+        data = QueryDict(mutable=True)
+        for key, value in params.items():
+            if isinstance(value, list):
+                data.setlist(key, value)
+            else:
+                data[key] = str(value)
+        return RecipeFilter(
+            data=data, queryset=Recipe.objects.all(), request=request
+        ).qs
+
+    def handle(self, *args, **options):
+        with benchmark_database(keepdb=options['keepdb']):
+            sizes = {name: options[name] for name in SEED_DEFAULTS}
+            self.stdout.write(f'Seeding {sizes} on {connection.vendor}...')
+            seed(**sizes)
+            user = User.objects.filter(
+                favorite_user__isnull=False,
+                shopping_cart_user__isnull=False,
+            ).first()
+            author = User.objects.filter(
+                recipe_author__isnull=False
+            ).first()
+            tags = list(Tag.objects.values_list('slug', flat=True))
+            for name, params in self.combinations(
+                user, author, tags
+            ).items():
+                self.report(name, self.filtered(params, user), options)
+
+    def report(self, name, queryset, options):
+        page = queryset[:options['page_size']]
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        page_timings = timeit(lambda: list(page.all()), options['runs'])
+        count_timings = timeit(queryset.count, options['runs'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {name}'))
+        self.stdout.write(
+            f'page p50={percentile(page_timings, 50):.2f}ms '
+            f'p95={percentile(page_timings, 95):.2f}ms | '
+            f'count p50={percentile(count_timings, 50):.2f}ms '
+            f'p95={percentile(count_timings, 95):.2f}ms | '
+            f'rows={queryset.count()}'
+        )
+        self.stdout.write(page.explain(**explain_options))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmark import (
+    SEED_DEFAULTS,
+    benchmark_database,
+    percentile,
+    seed,
+    timeit,
+)
+from api.filters import RecipeFilter
+from api.models import Recipe, Tag
+
+
+class Command(BaseCommand):
+    help = ('Compare multi-tag filtering through JOIN + DISTINCT with the '
+            'id__in semi-join used by RecipeFilter on a seeded database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--selected', type=int, default=5,
+                            help='Number of tags in the filter.')
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        sizes = {
+            **SEED_DEFAULTS,
+            'recipes': options['recipes'],
+            'tags': options['tags'],
+            'tags_per_recipe': options['tags_per_recipe'],
+        }
+        with benchmark_database(keepdb=options['keepdb']):
+            self.stdout.write(f'Seeding {sizes} on {connection.vendor}...')
+            seed(**sizes)
+            tags = list(Tag.objects.all()[:options['selected']])
+            approaches = {
+                'join + distinct': Recipe.objects.filter(
+                    tags__in=tags
+                ).distinct(),
+                'semi-join': RecipeFilter(
+                    data={}, queryset=Recipe.objects.all()
+                ).get_tags(Recipe.objects.all(), 'tags', tags),
+            }
+            results = {
+                name: list(queryset.values_list('id', flat=True))
+                for name, queryset in approaches.items()
+            }
+            if len(set(map(tuple, results.values()))) != 1:
+                raise CommandError('Approaches returned different recipes')
+            self.stdout.write(
+                f'{len(tags)} of {sizes["tags"]} tags selected, '
+                f'{len(results["semi-join"])} unique recipes'
+            )
+            for name, queryset in approaches.items():
+                self.report(name, queryset, options)
+
+    def report(self, name, queryset, options):
+        page = queryset[:options['page_size']]
+        page_timings = timeit(lambda: list(page.all()), options['runs'])
+        count_timings = timeit(queryset.count, options['runs'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {name}'))
+        self.stdout.write(
+            f'page p50={percentile(page_timings, 50):.2f}ms '
+            f'p95={percentile(page_timings, 95):.2f}ms | '
+            f'count p50={percentile(count_timings, 50):.2f}ms '
+            f'p95={percentile(count_timings, 95):.2f}ms'
+        )
+        self.stdout.write(page.explain())
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.images import process_recipe_image
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Build thumbnail and WebP variants for recipe images '
+            'that do not have them yet.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild variants of every recipe.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_thumb='')
+        failed = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                process_recipe_image(recipe_id)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Recipe {recipe_id}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Done, failed: {failed}'))
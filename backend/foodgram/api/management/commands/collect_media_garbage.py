@@ -0,0 +1,56 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import Recipe
+
+FIELDS = ('image', 'image_thumb', 'image_webp')
+
+
+class Command(BaseCommand):
+    help = ('Delete recipe image files that no recipe references. '
+            'Files younger than --grace-hours are kept, so uploads of '
+            'unfinished transactions survive.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--grace-hours', type=float, default=24)
+
+    def referenced(self):
+        names = set()
+        for row in Recipe.objects.values_list(*FIELDS).iterator():
+            names.update(name for name in row if name)
+        return names
+
+    def candidates(self, storage, directory):
+        root = storage.path(directory)
+        for path, _, files in os.walk(root):
+            for file_name in files:
+                full_path = os.path.join(path, file_name)
+                name = os.path.relpath(full_path, storage.location)
+                yield name.replace(os.sep, '/'), full_path
+
+    def handle(self, *args, **options):
+        referenced = self.referenced()
+        deadline = time.time() - options['grace_hours'] * 3600
+        removed = freed = 0
+        for field_name in FIELDS:
+            field = Recipe._meta.get_field(field_name)
+            for name, full_path in self.candidates(field.storage,
+                                                   field.upload_to):
+                if name in referenced:
+                    continue
+                stat = os.stat(full_path)
+                if stat.st_mtime > deadline:
+                    continue
+                removed += 1
+                freed += stat.st_size
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    field.storage.delete(name)
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} files, {freed} bytes'
+        ))
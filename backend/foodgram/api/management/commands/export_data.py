@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.dump import FORMATS, export_dataset
+
+
+class Command(BaseCommand):
+    help = ('Dump users, tags, ingredients, recipes and their relations '
+            'into a directory, one file per model, for import_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson',
+                            help='copy uses PostgreSQL COPY CSV files.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            entries = export_dataset(options['directory'], options['format'],
+                                     options['chunk_size'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        for entry in entries:
+            self.stdout.write(f'{entry["model"]}: {entry["rows"]}')
+        self.stdout.write(self.style.SUCCESS('Export finished'))
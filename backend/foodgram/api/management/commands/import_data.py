@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.dump import import_dataset
+
+
+class Command(BaseCommand):
+    help = 'Load a directory written by export_data in one transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete existing data of the dumped models.')
+
+    def handle(self, *args, **options):
+        try:
+            entries = import_dataset(options['directory'],
+                                     options['chunk_size'], options['flush'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        for entry in entries:
+            self.stdout.write(f'{entry["model"]}: {entry["rows"]}')
+        self.stdout.write(self.style.SUCCESS('Import finished'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importers import import_ingredients, read_csv, read_json
+
+READERS = {'json': read_json, 'csv': read_csv}
+
+
+class Command(BaseCommand):
+    help = ('Import ingredients from a JSON array or a CSV file '
+            '(name, measurement_unit). Existing ingredients are skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=READERS, default=None,
+                            help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError(f'Unknown format of {path}, use --format.')
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                inserted, skipped = import_ingredients(
+                    READERS[file_format](file), options['chunk_size']
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Inserted {inserted}, skipped {skipped}'
+        ))
@@ -1,16 +1,13 @@
-import json
-
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 
-from api.models import Ingredient
-
 
 class Command(BaseCommand):
+    help = 'Import ingredients.json, kept for compatibility.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='ingredients.json')
 
     def handle(self, *args, **options):
-        with open('ingredients.json', "rb") as f:
-            reader = json.load(f)
-        model_object = Ingredient
-        for row in reader:
-            model_object.objects.create(**row)
-        self.stdout.write(self.style.SUCCESS('Database Successfully Update'))
+        call_command('import_ingredients', options['path'], format='json',
+                     stdout=self.stdout, stderr=self.stderr)
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from api.models import AmountOfIngredient, ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = ('Rebuild denormalized shopping cart totals from carted recipes '
+            'or verify them with --verify.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare stored totals with recomputed ones.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def expected_totals(self):
+        return AmountOfIngredient.objects.filter(
+            recipe__shopping_cart_recipe__isnull=False
+        ).values_list(
+            'recipe__shopping_cart_recipe__user', 'ingredient'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by()
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild(options['batch_size'])
+
+    def rebuild(self, batch_size):
+        with transaction.atomic():
+            ShoppingCartTotal.objects.all().delete()
+            batch, created = [], 0
+            for user_id, ingredient_id, total in (
+                self.expected_totals().iterator()
+            ):
+                batch.append(ShoppingCartTotal(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=total
+                ))
+                if len(batch) == batch_size:
+                    ShoppingCartTotal.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            ShoppingCartTotal.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Shopping cart totals rebuilt: {created} rows'
+        ))
+
+    def verify(self):
+        expected = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in (
+                self.expected_totals().iterator()
+            )
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in (
+                ShoppingCartTotal.objects.filter(amount__gt=0).values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                ).iterator()
+            )
+        }
+        mismatched = [
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        for user_id, ingredient_id in sorted(mismatched)[:20]:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'expected {expected.get((user_id, ingredient_id), 0)}, '
+                f'stored {stored.get((user_id, ingredient_id), 0)}'
+            )
+        if mismatched:
+            raise CommandError(
+                f'{len(mismatched)} shopping cart totals are out of sync'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Shopping cart totals are consistent: {len(stored)} rows'
+        ))
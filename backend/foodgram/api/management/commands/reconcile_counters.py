@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Repair denormalized favorite, shopping cart, follower and '
+            'recipe counters or only report drift with --verify.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only count rows whose counters are out of sync.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile_counters(dry_run=options['verify'])
+        for counter, rows in drift.items():
+            self.stdout.write(f'{counter}: {rows}')
+        total = sum(drift.values())
+        if options['verify'] and total:
+            raise CommandError(f'{total} counters are out of sync')
+        self.stdout.write(self.style.SUCCESS(
+            f'Counters repaired: {total} rows' if not options['verify']
+            else 'Counters are consistent'
+        ))
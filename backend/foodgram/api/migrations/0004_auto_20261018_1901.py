@@ -0,0 +1,58 @@
+# Generated by Django 2.2.19 on 2026-10-18 19:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_shopping_cart_totals(apps, schema_editor):
+    AmountOfIngredient = apps.get_model('api', 'AmountOfIngredient')
+    ShoppingCartTotal = apps.get_model('api', 'ShoppingCartTotal')
+    totals = AmountOfIngredient.objects.filter(
+        recipe__shopping_cart_recipe__isnull=False
+    ).values_list(
+        'recipe__shopping_cart_recipe__user', 'ingredient'
+    ).annotate(
+        total=models.Sum('amount')
+    ).order_by()
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id,
+                          amount=total)
+        for user_id, ingredient_id, total in totals.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0003_auto_20220225_1454'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(help_text='Загрузите изображение', upload_to='recipes/images/', verbose_name='Картинка'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='api.Ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Покупатель')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='uniq_ingredient_in_cart_total'),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_totals, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.19 on 2026-10-18 20:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('api', 'Recipe', 'favorites_count', 'api', 'Favorite', 'recipe'),
+    ('api', 'Recipe', 'shopping_cart_count',
+     'api', 'ShoppingCart', 'recipe'),
+    ('users', 'User', 'followers_count', 'users', 'Follow', 'author'),
+    ('users', 'User', 'recipes_count', 'api', 'Recipe', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, model, field, counted_app, counted, link in COUNTERS:
+        counted = apps.get_model(counted_app, counted)
+        apps.get_model(app, model).objects.update(**{field: Coalesce(
+            Subquery(counted.objects.filter(
+                **{link: OuterRef('pk')}
+            ).order_by().values(link).annotate(
+                count=Count('pk')
+            ).values('count')),
+            Value(0),
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_auto_20261018_1955'),
+        ('users', '0004_auto_20261018_2005'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
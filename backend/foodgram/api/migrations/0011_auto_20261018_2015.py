@@ -0,0 +1,49 @@
+# Generated by Django 2.2.19 on 2026-10-18 20:15
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+CREATE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS api_recipe_search_vector_gin '
+    'ON api_recipe USING gin (search_vector)',
+    "UPDATE api_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', api_recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(api_ingredient.name, ' ') "
+    "FROM api_amountofingredient JOIN api_ingredient "
+    "ON api_ingredient.id = api_amountofingredient.ingredient_id "
+    "WHERE api_amountofingredient.recipe_id = api_recipe.id"
+    "), '')), 'B') || "
+    "setweight(to_tsvector('russian', api_recipe.text), 'C')",
+)
+DROP_INDEX = (
+    'DROP INDEX IF EXISTS api_recipe_search_vector_gin',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_auto_20261018_2005'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEX),
+            run_on_postgresql(DROP_INDEX),
+        ),
+    ]
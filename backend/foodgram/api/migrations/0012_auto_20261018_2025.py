@@ -0,0 +1,35 @@
+# Generated by Django 2.2.19 on 2026-10-18 20:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_ingredients_count(apps, schema_editor):
+    AmountOfIngredient = apps.get_model('api', 'AmountOfIngredient')
+    apps.get_model('api', 'Recipe').objects.update(
+        ingredients_count=Coalesce(Subquery(
+            AmountOfIngredient.objects.filter(
+                recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                count=Count('pk')
+            ).values('count')
+        ), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_auto_20261018_2015'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Число ингредиентов'),
+        ),
+        migrations.RunPython(fill_ingredients_count,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.19 on 2026-10-18 20:35
+
+from django.db import migrations
+
+SEARCH_NAME = "REPLACE(LOWER(name::text), 'ё', 'е')"
+
+CREATE_INDEXES = (
+    'DROP INDEX IF EXISTS api_ingredient_name_trgm',
+    'DROP INDEX IF EXISTS api_ingredient_name_prefix',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_search_name_prefix '
+    f'ON api_ingredient ({SEARCH_NAME} text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_search_name_trgm '
+    f'ON api_ingredient USING gin ({SEARCH_NAME} gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS api_ingredient_search_name_trgm',
+    'DROP INDEX IF EXISTS api_ingredient_search_name_prefix',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_prefix '
+    'ON api_ingredient (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_trgm '
+    'ON api_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_auto_20261018_2025'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEXES),
+            run_on_postgresql(DROP_INDEXES),
+        ),
+    ]
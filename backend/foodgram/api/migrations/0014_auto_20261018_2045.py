@@ -0,0 +1,20 @@
+# Generated by Django 2.2.19 on 2026-10-18 20:45
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_tables(apps, schema_editor):
+    """ Таблица кэша версий (DatabaseCache), общего для процессов. """
+    call_command('createcachetable', database=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_auto_20261018_2035'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_tables, migrations.RunPython.noop),
+    ]
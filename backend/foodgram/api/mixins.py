@@ -1,7 +1,87 @@
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
 from rest_framework import mixins, viewsets
+from rest_framework.renderers import JSONRenderer
+
+from .cache import (
+    RESPONSE_EPOCH,
+    get_rendered,
+    get_response,
+    get_response_versions,
+    response_key,
+    store_response,
+)
 
 
 class CreateListViewSet(mixins.CreateModelMixin,
                         mixins.ListModelMixin,
                         viewsets.GenericViewSet):
     pass
+
+
+class CachedListMixin:
+    """ Список справочника без параметров запроса отдаётся готовым JSON
+    из кэша процесса с сильным ETag; на If-None-Match отвечает 304.
+    Кэш сбрасывается сменой версии cache_name (см. api/signals.py).
+    """
+
+    cache_name = None
+
+    def render_list(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return JSONRenderer().render(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        body, etag = get_rendered(self.cache_name, self.render_list)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+class AnonymousResponseCacheMixin:
+    """ Ответы list и retrieve для анонимных пользователей хранятся
+    целиком в кэше RESPONSE_CACHE_ALIAS. Запись действительна, пока
+    не сменились версии её зависимостей: cache_scope() — выборка
+    до построения ответа, response_dependencies() — объекты,
+    попавшие в ответ. Версии меняет api/signals.py. Запросы,
+    для которых cacheable() ложно, в кэш не попадают.
+    """
+
+    def cacheable(self):
+        return True
+
+    def cache_scope(self):
+        return []
+
+    def response_dependencies(self, data):
+        return []
+
+    def cached(self, view, request, *args, **kwargs):
+        if (not request.user.is_anonymous
+                or request.accepted_renderer.format != 'json'
+                or not self.cacheable()):
+            return view(request, *args, **kwargs)
+        key = response_key(request)
+        body = get_response(key)
+        if body is None:
+            versions = get_response_versions(
+                [RESPONSE_EPOCH, *self.cache_scope()], create=True
+            )
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = JSONRenderer().render(response.data)
+            store_response(key, body, versions,
+                           self.response_dependencies(response.data))
+        return HttpResponse(body, content_type='application/json')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
@@ -1,7 +1,11 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models.functions import Greatest, RowNumber
+
+from foodgram.models import DenormalizedFieldsMixin
 
 from .validators import min_cooking_time
 
@@ -60,7 +64,66 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        """ Загружает автора, теги и ингредиенты фиксированным
+        числом запросов независимо от количества рецептов.
+        """
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'amount_recipe',
+                queryset=AmountOfIngredient.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """ Добавляет признаки is_favorited и is_in_shopping_cart
+        для пользователя подзапросами Exists.
+        """
+        if user is None or user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+        )
+
+    def latest_per_author(self, author_ids, limit=None):
+        """ Последние рецепты авторов: не более limit рецептов
+        на каждого автора одним запросом (ROW_NUMBER() OVER PARTITION BY).
+        """
+        author_ids = list(author_ids)
+        if not author_ids:
+            # Пустой IN не компилируется в SQL (EmptyResultSet).
+            return self.none()
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return queryset
+        queryset = queryset.annotate(
+            row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=[models.F('author_id')],
+                order_by=[
+                    models.F('pub_date').desc(), models.F('id').desc()
+                ],
+            )
+        ).order_by()
+        sql, params = queryset.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s '
+            f'ORDER BY ranked.author_id, ranked.row_number',
+            (*params, limit)
+        )
+
+
+class Recipe(DenormalizedFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -77,6 +140,18 @@ class Recipe(models.Model):
         verbose_name='Картинка',
         help_text='Загрузите изображение'
     )
+    image_thumb = models.ImageField(
+        upload_to='recipes/thumbs/',
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра'
+    )
+    image_webp = models.ImageField(
+        upload_to='recipes/webp/',
+        blank=True,
+        editable=False,
+        verbose_name='Картинка в WebP'
+    )
     text = models.TextField(
         verbose_name='Текст',
         help_text='Описание рецепта'
@@ -100,15 +175,72 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок'
+    )
+    ingredients_count = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число ингредиентов'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    denormalized_fields = ('favorites_count', 'shopping_cart_count',
+                           'ingredients_count', 'search_vector',
+                           'image_thumb', 'image_webp')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_count_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.name
 
+    def has_new_image(self):
+        """ Картинка выбрана, но ещё не сохранена в хранилище. """
+        return bool(self.image and not self.image._committed)
+
+    def default_update_fields(self):
+        """ Варианты картинки пишет api/images.py, но при смене
+        картинки reset_image_variants сбрасывает их, и сброс
+        сохраняется вместе с новой картинкой.
+        """
+        fields = super().default_update_fields()
+        if self.has_new_image():
+            fields += ['image_thumb', 'image_webp']
+        return fields
+
+
+class AmountOfIngredientQuerySet(models.QuerySet):
+    def amounts(self, recipe_id):
+        """ Количества ингредиентов рецепта: {ingredient_id: amount}. """
+        return dict(self.filter(recipe_id=recipe_id).values_list(
+            'ingredient_id', 'amount'
+        ))
+
 
 class AmountOfIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -129,6 +261,8 @@ class AmountOfIngredient(models.Model):
         error_messages={'validators': MIN_AMOUNT},
     )
 
+    objects = AmountOfIngredientQuerySet.as_manager()
+
     class Meta:
         ordering = ('-id',)
         verbose_name = 'Количество ингредиента'
@@ -163,6 +297,12 @@ class Favorite(models.Model):
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='uniq_favorite')
         ]
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='favorite_user_id_idx'),
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx'),
+        ]
 
 
 class ShoppingCart(models.Model):
@@ -189,3 +329,182 @@ class ShoppingCart(models.Model):
             models.UniqueConstraint(fields=['recipe', 'user'],
                                     name='uniq_recipe_in_cart')
         ]
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='cart_user_id_idx'),
+        ]
+
+
+class ShoppingCartTotalQuerySet(models.QuerySet):
+    def shopping_list(self, user):
+        """ Готовый список покупок пользователя: одно чтение по индексу
+        без агрегации по рецептам.
+        """
+        return self.filter(user=user, amount__gt=0).values(
+            'ingredient',
+            name=models.F('ingredient__name'),
+            measurement_unit=models.F('ingredient__measurement_unit'),
+            total=models.F('amount'),
+        ).order_by('name')
+
+    def add_amounts(self, user_ids, amounts, batch_size=500):
+        """ Прибавляет к итогам пользователей user_ids количества
+        ингредиентов amounts ({ingredient_id: delta}, delta может быть
+        отрицательной). Пустые строки удаляются.
+        """
+        amounts = {key: value for key, value in amounts.items() if value}
+        user_ids = list(user_ids)
+        if not amounts or not user_ids:
+            return
+        delta = models.Case(
+            *[models.When(ingredient_id=key, then=models.Value(value))
+              for key, value in amounts.items()],
+            default=models.Value(0),
+            output_field=models.IntegerField(),
+        )
+        # Строки нужно создавать только под прибавку, а удалять
+        # опустевшие — только после вычитания.
+        added = [key for key, value in amounts.items() if value > 0]
+        subtracted = len(added) < len(amounts)
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            if added:
+                self.bulk_create(
+                    [self.model(user_id=user_id, ingredient_id=ingredient_id)
+                     for user_id in batch for ingredient_id in added],
+                    ignore_conflicts=True
+                )
+            rows = self.filter(user_id__in=batch, ingredient_id__in=amounts)
+            rows.update(
+                amount=Greatest(models.F('amount') + delta, models.Value(0))
+            )
+            if subtracted:
+                rows.filter(amount=0).delete()
+
+    def add_recipe_amounts(self, recipe_id, amounts):
+        """ Прибавляет amounts к итогам всех, у кого рецепт
+        recipe_id в списке покупок.
+        """
+        if any(amounts.values()):
+            self.add_amounts(ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).order_by().values_list('user_id', flat=True), amounts)
+
+
+class ShoppingCartTotal(models.Model):
+    """ Денормализованный итог списка покупок пользователя.
+    Обновляется при добавлении и удалении рецептов из списка покупок
+    и при изменении ингредиентов рецептов в нём.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Покупатель'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+        default=0,
+    )
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='uniq_ingredient_in_cart_total')
+        ]
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    def trim(self, user_ids, keep):
+        """ Оставляет каждому пользователю из user_ids не больше keep
+        последних записей. Возвращает число удалённых записей.
+        """
+        ranked = self.filter(user_id__in=user_ids).annotate(
+            row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=[models.F('user_id')],
+                order_by=[
+                    models.F('pub_date').desc(),
+                    models.F('recipe_id').desc(),
+                ],
+            )
+        ).order_by().values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT ranked.id FROM ({sql}) ranked '
+                f'WHERE ranked.row_number > %s)',
+                (*params, keep)
+            )
+            return cursor.rowcount
+
+
+class FeedEntry(models.Model):
+    """ Рецепт в ленте подписчика; записи создаёт api/feed.py. """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта'
+    )
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='uniq_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='feed_user_pub_date_idx'),
+        ]
+
+
+class RecipeIngredientsChange(models.Model):
+    """ Журнал изменений ингредиентов рецептов. Процессы дочитывают
+    его и обновляют в индексе подбора рецептов (api/search.py) только
+    изменённые рецепты; запись без рецепта — перестроить индекс целиком.
+    """
+
+    recipe_id = models.PositiveIntegerField(
+        null=True,
+        verbose_name='Рецепт'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Изменение ингредиентов рецепта'
+        verbose_name_plural = 'Изменения ингредиентов рецептов'
@@ -1,6 +1,144 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .feed import read_feed
+
+INVALID_CURSOR = 'Неверный курсор'
 
 
 class CustomPaginator(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+def approximate_count(queryset):
+    """ Оценка числа строк по статистике планировщика PostgreSQL
+    вместо COUNT(*). На других СУБД считается точное значение.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+class KeysetPaginator(CustomPaginator):
+    """ Постраничный вывод по номеру страницы, а с параметром ?cursor=
+    (можно пустым для первой страницы) — по ключу (pub_date, id)
+    без OFFSET и COUNT(*). С ?count=approximate в ответ добавляется
+    оценка общего числа записей. С другой сортировкой (?ordering=,
+    ?search=) курсор не применяется.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    reordering_query_params = ('ordering', 'search')
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.keyset = (
+            self.cursor_query_param in params
+            and not any(params.get(param)
+                        for param in self.reordering_query_params)
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.count = approximate_count(queryset)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+        results = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = (results[-1].pub_date, results[-1].id)
+        return results
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                cursor.encode('ascii')
+            ).decode('ascii').split('|')
+            pub_date = parse_datetime(pub_date)
+            if pub_date is None:
+                raise ValueError
+            return pub_date, int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(INVALID_CURSOR)
+
+    def encode_cursor(self, position):
+        pub_date, pk = position
+        return urlsafe_b64encode(
+            f'{pub_date.isoformat()}|{pk}'.encode('ascii')
+        ).decode('ascii')
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['results'] = data
+        return Response(response)
+
+
+class FeedPaginator(KeysetPaginator):
+    """ Лента всегда выводится по курсору: ключи страницы читает
+    read_feed, рецепты загружаются из queryset по id.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = True
+        self.request = request
+        self.count = None
+        page_size = self.get_page_size(request)
+        keys = read_feed(request.user, self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        ), page_size + 1)
+        self.next_position = None
+        if len(keys) > page_size:
+            keys = keys[:page_size]
+            self.next_position = keys[-1]
+        recipes = queryset.in_bulk([pk for _, pk in keys])
+        return [recipes[pk] for _, pk in keys if pk in recipes]
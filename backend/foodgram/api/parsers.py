@@ -0,0 +1,223 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import JSONParser
+
+CHUNK_SIZE = 64 * 1024
+DATA_URI = b'data:'
+BASE64_HEADER = b';base64,'
+MAX_HEADER = 256
+WHITESPACE = b' \t\r\n'
+ESCAPED_WHITESPACE = (b'\\n', b'\\r', b'\\t')
+QUOTE = ord('"')
+BACKSLASH = ord('\\')
+COLON = ord(':')
+INVALID_BASE64 = 'Картинка должна быть строкой base64'
+IMAGE_TOO_LARGE = 'Картинка больше {} байт'
+REQUEST_TOO_LARGE = 'Запрос больше {} байт'
+JSON_ERROR = 'Ошибка разбора JSON: {}'
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос'
+    default_code = 'payload_too_large'
+
+
+class Base64Sink:
+    """ Декодирует base64 по частям во временный файл,
+    пропуская заголовок data URI, экранирование \\/ из JSON
+    и переносы строк (в том числе экранированные \\n).
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.file = TemporaryUploadedFile(
+            'image', 'application/octet-stream', 0, None
+        )
+        self.size = 0
+        self.header = b''
+        self.carry = b''
+        self.rest = b''
+
+    def write(self, chunk):
+        data = self.carry + chunk
+        self.carry = b''
+        if data.endswith(b'\\'):
+            data, self.carry = data[:-1], b'\\'
+        data = data.replace(b'\\/', b'/')
+        for escape in ESCAPED_WHITESPACE:
+            data = data.replace(escape, b'')
+        data = data.translate(None, WHITESPACE)
+        if self.header is not None:
+            data = self._strip_header(self.header + data)
+            if data is None:
+                return
+        data = self.rest + data
+        usable = len(data) - len(data) % 4
+        self.rest = data[usable:]
+        self._decode(data[:usable])
+
+    def _strip_header(self, data):
+        if len(data) < len(DATA_URI) and DATA_URI.startswith(data):
+            self.header = data
+            return None
+        if data.startswith(DATA_URI):
+            if BASE64_HEADER not in data:
+                if len(data) > MAX_HEADER:
+                    raise ParseError(INVALID_BASE64)
+                self.header = data
+                return None
+            data = data.split(BASE64_HEADER, 1)[1]
+        self.header = None
+        return data
+
+    def _decode(self, data):
+        try:
+            decoded = base64.b64decode(data, validate=True)
+        except binascii.Error:
+            raise ParseError(INVALID_BASE64)
+        self.size += len(decoded)
+        if self.size > self.max_bytes:
+            self.file.close()
+            raise PayloadTooLarge(IMAGE_TOO_LARGE.format(self.max_bytes))
+        self.file.write(decoded)
+
+    def close(self):
+        if self.header:
+            self.header, data = None, self.header
+            self.rest += data
+        if self.rest or self.carry:
+            self._decode(self.rest + self.carry)
+        self.file.flush()
+        self.file.seek(0)
+        self.file.size = self.size
+        return self.file
+
+
+class ImageScanner:
+    """ Копирует JSON без значения поля верхнего уровня field_name:
+    вместо строки base64 подставляет null, а саму строку
+    передаёт в Base64Sink.
+    """
+
+    def __init__(self, field_name, max_bytes):
+        self.key = field_name.encode()
+        self.max_bytes = max_bytes
+        self.head = bytearray()
+        self.sink = None
+        self.image = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string = bytearray()
+        self.last_string = None
+        self.pending_key = None
+
+    def feed(self, chunk):
+        position = 0
+        while position < len(chunk):
+            if self.sink is None:
+                position = self._scan(chunk, position)
+                continue
+            end = chunk.find(b'"', position)
+            if end == -1:
+                self.sink.write(chunk[position:])
+                return
+            self.sink.write(chunk[position:end])
+            if self.image is not None:
+                self.image.close()
+            self.image = self.sink.close()
+            self.sink = None
+            position = end + 1
+
+    def _scan(self, chunk, position):
+        for index in range(position, len(chunk)):
+            byte = chunk[index]
+            if self.in_string:
+                self._string_byte(byte)
+            elif (byte == QUOTE and self.depth == 1
+                    and self.pending_key == self.key):
+                self.head += b'null'
+                self.pending_key = None
+                self.sink = Base64Sink(self.max_bytes)
+                return index + 1
+            else:
+                self._structure_byte(byte)
+        return len(chunk)
+
+    def _string_byte(self, byte):
+        self.head.append(byte)
+        if self.escape:
+            self.escape = False
+        elif byte == BACKSLASH:
+            self.escape = True
+        elif byte == QUOTE:
+            self.in_string = False
+            self.last_string = bytes(self.string)
+            return
+        if len(self.string) <= len(self.key):
+            self.string.append(byte)
+
+    def _structure_byte(self, byte):
+        self.head.append(byte)
+        if byte == QUOTE:
+            self.in_string = True
+            self.string.clear()
+            self.pending_key = None
+            return
+        if byte in WHITESPACE:
+            return
+        self.pending_key = self.last_string if byte == COLON else None
+        self.last_string = None
+        if byte in b'{[':
+            self.depth += 1
+        elif byte in b'}]':
+            self.depth -= 1
+
+
+def check_content_length(request, max_bytes):
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return
+    if length > max_bytes:
+        raise PayloadTooLarge(REQUEST_TOO_LARGE.format(max_bytes))
+
+
+class RecipeJSONParser(JSONParser):
+    """ JSON-парсер для рецептов: картинка из поля image
+    декодируется по частям во временный файл и не копируется
+    в память целиком. Запрос больше RECIPE_REQUEST_MAX_BYTES
+    отклоняется до чтения тела.
+    """
+
+    field_name = 'image'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context.get('request')
+        if request is not None:
+            check_content_length(request, settings.RECIPE_REQUEST_MAX_BYTES)
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        scanner = ImageScanner(self.field_name,
+                               settings.RECIPE_IMAGE_MAX_BYTES)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            scanner.feed(chunk)
+        if scanner.sink is not None:
+            raise ParseError(JSON_ERROR.format('unterminated image string'))
+        try:
+            data = json.loads(scanner.head.decode(encoding))
+        except ValueError as error:
+            raise ParseError(JSON_ERROR.format(error))
+        if scanner.image is not None and isinstance(data, dict):
+            data[self.field_name] = scanner.image if scanner.image.size else ''
+        return data
@@ -0,0 +1,262 @@
+import csv
+import json
+import re
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.pdfbase.ttfonts import SUBSETN, TTFont, makeToUnicodeCMap
+from rest_framework import renderers
+
+TITLE = 'Ваш список покупок:'
+LINES_PER_PAGE = 50
+PDF_FONT_NAME = 'DejaVuSans'
+# Символы вне BMP (эмодзи) ToUnicode reportlab описать не может.
+NON_BMP = re.compile('[^\u0000-\uffff]')
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """ Базовый рендерер списка покупок.
+    render_stream() отдаёт документ по частям для StreamingHttpResponse,
+    render() нужен DRF для ответов с ошибками.
+    """
+
+    def render_stream(self, ingredients, title=TITLE):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            chunks = self.render_stream((), title=str(data.get('detail')))
+        else:
+            chunks = self.render_stream(data)
+        return b''.join(
+            chunk if isinstance(chunk, bytes) else chunk.encode(self.charset)
+            for chunk in chunks
+        )
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render_stream(self, ingredients, title=TITLE):
+        yield f'{title}\n\n'
+        for ingredient in ingredients:
+            yield (f'   {ingredient["name"]}, '
+                   f'{ingredient["measurement_unit"]} -- '
+                   f'{ingredient["total"]}\n')
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render_stream(self, ingredients, title=TITLE):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            yield writer.writerow((ingredient['name'],
+                                   ingredient['measurement_unit'],
+                                   ingredient['total']))
+
+
+class ShoppingListJSONRenderer(renderers.JSONRenderer):
+    def render_stream(self, ingredients, title=TITLE):
+        separator = ''
+        yield '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['name'],
+                'measurement_unit': ingredient['measurement_unit'],
+                'amount': ingredient['total'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+    @property
+    def content_type(self):
+        return f'{self.media_type}; charset=utf-8'
+
+
+def _pdf_escape(byte):
+    if byte < 32 or byte > 126 or byte in b'()\\':
+        return b'\\%03o' % byte
+    return bytes((byte,))
+
+
+PDF_ESCAPES = [_pdf_escape(byte) for byte in range(256)]
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    """ TrueType-шрифт с кириллицей, разбирается один раз на процесс. """
+    return TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+
+
+class PDFStreamWriter:
+    """ Минимальный PDF-документ, который пишется постранично.
+    Смещения объектов считаются по мере отдачи байтов, поэтому
+    в памяти находится только текущая страница. Текст набирается
+    TrueType-шрифтом: reportlab раскладывает символы по подмножествам
+    до 256 глифов, а сами подмножества встраиваются в конце документа,
+    когда известны все использованные символы.
+    """
+
+    CATALOG, PAGES, RESOURCES = 1, 2, 3
+
+    def __init__(self, font=None):
+        self.font = font or get_pdf_font()
+        self.position = 0
+        self.offsets = {}
+        self.pages = []
+        self.next_number = 4
+
+    def _write(self, data):
+        self.position += len(data)
+        return data
+
+    def _object(self, number, body):
+        self.offsets[number] = self.position
+        return self._write(
+            b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        )
+
+    def _stream(self, number, data, **entries):
+        data = zlib.compress(data)
+        extra = b''.join(b' /%s %d' % (key.encode('ascii'), value)
+                         for key, value in entries.items())
+        return self._object(number, (
+            b'<< /Length %d /Filter /FlateDecode%s >>\nstream\n'
+            % (len(data), extra) + data + b'\nendstream'
+        ))
+
+    def _reserve(self, count):
+        numbers = range(self.next_number, self.next_number + count)
+        self.next_number += count
+        return numbers
+
+    def start(self):
+        yield self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _show(self, line):
+        return b''.join(
+            b'/F%d 12 Tf (' % subset
+            + b''.join(PDF_ESCAPES[byte] for byte in text)
+            + b') Tj '
+            for subset, text in self.font.splitString(
+                NON_BMP.sub('?', line), self
+            )
+        )
+
+    def page(self, lines):
+        content = b'BT 14 TL 50 800 Td\n' + b''.join(
+            self._show(line) + b'T*\n' for line in lines
+        ) + b'ET'
+        content_number, page_number = self._reserve(2)
+        self.pages.append(page_number)
+        yield self._stream(content_number, content)
+        yield self._object(page_number, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] '
+            b'/Resources %d 0 R /Contents %d 0 R >>'
+            % (self.PAGES, self.RESOURCES, content_number)
+        ))
+
+    def _font_subset(self, index, subset, numbers):
+        """ Встроенный файл, описание, ToUnicode и сам шрифт
+        одного подмножества.
+        """
+        face = self.font.face
+        name = b''.join((SUBSETN(index), b'+', face.name, face.subfontNameX))
+        file_number, descriptor_number, cmap_number, font_number = numbers
+        font_file = face.makeSubset(subset)
+        yield self._stream(file_number, font_file, Length1=len(font_file))
+        yield self._object(descriptor_number, (
+            f'<< /Type /FontDescriptor /Ascent {face.ascent} '
+            f'/CapHeight {face.capHeight} /Descent {face.descent} '
+            f'/Flags {face.flags} '
+            f'/FontBBox [{" ".join(map(str, face.bbox))}] '
+            f'/FontName /{name.decode("ascii")} '
+            f'/ItalicAngle {face.italicAngle} /StemV {face.stemV} '
+            f'/FontFile2 {file_number} 0 R >>'
+        ).encode('ascii'))
+        yield self._stream(cmap_number, makeToUnicodeCMap(
+            name.decode('ascii'), subset
+        ).encode('ascii'))
+        widths = ' '.join(f'{face.getCharWidth(code):g}' for code in subset)
+        yield self._object(font_number, (
+            f'<< /Type /Font /Subtype /TrueType '
+            f'/BaseFont /{name.decode("ascii")} '
+            f'/FirstChar 0 /LastChar {len(subset) - 1} /Widths [{widths}] '
+            f'/FontDescriptor {descriptor_number} 0 R '
+            f'/ToUnicode {cmap_number} 0 R >>'
+        ).encode('ascii'))
+
+    def finish(self):
+        state = self.font.state.pop(self)
+        fonts = []
+        for index, subset in enumerate(state.subsets):
+            numbers = self._reserve(4)
+            yield from self._font_subset(index, subset, numbers)
+            fonts.append(b'/F%d %d 0 R' % (index, numbers[-1]))
+        yield self._object(
+            self.RESOURCES,
+            b'<< /Font << %s >> >>' % b' '.join(fonts)
+        )
+        kids = b' '.join(b'%d 0 R' % number for number in self.pages)
+        yield self._object(self.PAGES, (
+            b'<< /Type /Pages /Kids [%s] /Count %d >>'
+            % (kids, len(self.pages))
+        ))
+        yield self._object(
+            self.CATALOG,
+            b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES
+        )
+        xref_position = self.position
+        yield b'xref\n0 %d\n0000000000 65535 f \n' % self.next_number
+        for number in range(1, self.next_number):
+            yield b'%010d 00000 n \n' % self.offsets[number]
+        yield b'trailer\n<< /Size %d /Root %d 0 R >>\n' % (
+            self.next_number, self.CATALOG
+        )
+        yield b'startxref\n%d\n%%%%EOF\n' % xref_position
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def render_stream(self, ingredients, title=TITLE):
+        writer = PDFStreamWriter()
+        yield from writer.start()
+        lines = [title, '']
+        for ingredient in ingredients:
+            lines.append(f'{ingredient["name"]}, '
+                         f'{ingredient["measurement_unit"]} -- '
+                         f'{ingredient["total"]}')
+            if len(lines) == LINES_PER_PAGE:
+                yield from writer.page(lines)
+                lines = []
+        if lines or not writer.pages:
+            yield from writer.page(lines)
+        yield from writer.finish()
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer,
+)
@@ -0,0 +1,546 @@
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+from datetime import timedelta
+from operator import itemgetter
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (
+    Case,
+    F,
+    FloatField,
+    IntegerField,
+    Max,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Lower, Replace
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+from .models import (
+    AmountOfIngredient,
+    Ingredient,
+    Recipe,
+    RecipeIngredientsChange,
+)
+from .stemmer import stem
+from .tasks import run_after_commit, run_in_background
+
+SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_VERSION = 'recipe_search'
+# Сколько журнал RecipeIngredientsChange ждёт записей, id которых
+# выдан раньше, а коммит случился позже.
+JOURNAL_SETTLE_TIME = timedelta(seconds=5)
+WORD = re.compile(r'\w+')
+# Название ингредиента для поиска в базе; по этому же выражению
+# построены индексы api_ingredient_search_name_*.
+INGREDIENT_SEARCH_NAME = Replace(Lower('name'), Value('ё'), Value('е'))
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'да', 'для', 'до', 'же', 'за', 'и',
+    'из', 'или', 'к', 'как', 'ко', 'на', 'над', 'не', 'но', 'о', 'об',
+    'от', 'по', 'под', 'при', 'про', 'с', 'со', 'то', 'у', 'что',
+))
+# Веса полей как у setweight() в PostgreSQL: A — название,
+# B — ингредиенты, C — описание (значения по умолчанию ts_rank).
+NAME_WEIGHT = 1.0
+INGREDIENTS_WEIGHT = 0.4
+TEXT_WEIGHT = 0.2
+
+# Пересчёт search_vector рецептов; в конце добавляется условие WHERE.
+RECIPE_VECTOR_SQL = (
+    "UPDATE api_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', api_recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(api_ingredient.name, ' ') "
+    "FROM api_amountofingredient JOIN api_ingredient "
+    "ON api_ingredient.id = api_amountofingredient.ingredient_id "
+    "WHERE api_amountofingredient.recipe_id = api_recipe.id"
+    "), '')), 'B') || "
+    "setweight(to_tsvector('russian', api_recipe.text), 'C')"
+)
+
+
+def is_postgresql(connection):
+    return connection.vendor == 'postgresql'
+
+
+def normalize(text):
+    return text.strip().lower().replace('ё', 'е')
+
+
+def tokenize(text):
+    """ Основы слов текста без служебных слов. """
+    return [
+        stem(word) for word in WORD.findall(normalize(text))
+        if word not in STOP_WORDS
+    ]
+
+
+def rank_ingredients(queryset, value, connection):
+    """ Поиск ингредиентов в базе без учёта регистра и разницы «ё» и «е»
+    (как normalize() у IngredientIndex): сначала совпадения по началу
+    названия, затем по подстроке. На PostgreSQL находятся и названия
+    с опечатками — с триграммным сходством (pg_trgm) не меньше
+    INGREDIENT_TRIGRAM_THRESHOLD, — и всё, кроме совпадений по началу,
+    ранжируется по сходству.
+    """
+    query = normalize(value)
+    queryset = queryset.annotate(
+        search_name=INGREDIENT_SEARCH_NAME,
+        prefix_rank=Case(
+            When(search_name__startswith=query, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+    )
+    matches = Q(search_name__contains=query)
+    if not is_postgresql(connection):
+        return queryset.filter(matches).order_by('prefix_rank', 'name')
+
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    return queryset.annotate(
+        similarity=TrigramSimilarity('search_name', query)
+    ).filter(
+        matches | Q(
+            search_name__trigram_similar=query,
+            similarity__gte=settings.INGREDIENT_TRIGRAM_THRESHOLD,
+        )
+    ).order_by('prefix_rank', '-similarity', 'name')
+
+
+class IngredientIndex:
+    """ Отсортированный по названию индекс ингредиентов в памяти процесса.
+    Совпадения по началу названия ищутся двоичным поиском,
+    совпадения по подстроке добавляются после них.
+    Индекс перестраивается при смене версии 'ingredients'.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.entries = ([], [])
+
+    def rebuild(self, version):
+        rows = sorted((
+            (normalize(name), {'id': pk, 'name': name,
+                               'measurement_unit': measurement_unit})
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        ), key=itemgetter(0))
+        self.entries = (
+            [key for key, _ in rows], [row for _, row in rows]
+        )
+        self.version = version
+
+    def ensure_fresh(self):
+        version = get_version('ingredients')
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.rebuild(version)
+
+    def search(self, value):
+        self.ensure_fresh()
+        keys, rows = self.entries
+        query = normalize(value)
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        prefix_matches = rows[start:end]
+        substring_matches = sorted(
+            (key.find(query), key, index)
+            for index, key in enumerate(keys)
+            if (index < start or index >= end) and query in key
+        )
+        return prefix_matches + [
+            rows[index] for _, _, index in substring_matches
+        ]
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_recipes(queryset, value, connection):
+    """ Полнотекстовый поиск рецептов по названию, описанию
+    и ингредиентам с сортировкой по релевантности. На PostgreSQL —
+    по столбцу search_vector (GIN, ts_rank), на других СУБД —
+    по индексу recipe_index в памяти процесса.
+    """
+    if is_postgresql(connection):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(value, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    ranked = recipe_index.search(value, settings.RECIPE_SEARCH_LIMIT)
+    if not ranked:
+        return queryset.none()
+    return queryset.filter(id__in=[pk for pk, _ in ranked]).annotate(
+        search_rank=Case(
+            *[When(id=pk, then=Value(rank)) for pk, rank in ranked],
+            output_field=FloatField(),
+        )
+    ).order_by('-search_rank', '-pub_date', '-id')
+
+
+def update_search_vectors(recipe_ids=None):
+    """ Обновляет поисковый индекс рецептов recipe_ids
+    (всех рецептов при recipe_ids=None).
+    """
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    if not is_postgresql(connection):
+        recipe_index.update(recipe_ids)
+        return
+    sql, params = RECIPE_VECTOR_SQL, []
+    if recipe_ids is not None:
+        sql, params = f'{sql} WHERE api_recipe.id = ANY(%s)', [recipe_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def update_ingredient_search_vectors(ingredient_id):
+    update_search_vectors(AmountOfIngredient.objects.filter(
+        ingredient_id=ingredient_id
+    ).values_list('recipe_id', flat=True))
+
+
+class RecipeSearchIndex:
+    """ Инвертированный индекс рецептов в памяти процесса для СУБД
+    без полнотекстового поиска: основа слова -> {id рецепта: вес}.
+    Процесс, сохранивший рецепт, обновляет только его; остальные
+    перестраивают индекс целиком при смене версии 'recipe_search'.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.postings = defaultdict(dict)
+        self.documents = {}
+
+    def weigh(self, name, ingredients, text):
+        weights = Counter()
+        for field, weight in ((name, NAME_WEIGHT),
+                              (' '.join(ingredients), INGREDIENTS_WEIGHT),
+                              (text, TEXT_WEIGHT)):
+            for term in tokenize(field):
+                weights[term] += weight
+        return weights
+
+    def load(self, recipe_ids=None):
+        recipes = Recipe.objects.order_by()
+        amounts = AmountOfIngredient.objects.order_by()
+        if recipe_ids is not None:
+            recipes = recipes.filter(id__in=recipe_ids)
+            amounts = amounts.filter(recipe_id__in=recipe_ids)
+        ingredients = defaultdict(list)
+        for recipe_id, name in amounts.values_list(
+            'recipe_id', 'ingredient__name'
+        ).iterator():
+            ingredients[recipe_id].append(name)
+        for pk, name, text in recipes.values_list(
+            'id', 'name', 'text'
+        ).iterator():
+            yield pk, self.weigh(name, ingredients[pk], text)
+
+    def add(self, pk, weights):
+        self.documents[pk] = weights
+        for term, weight in weights.items():
+            self.postings[term][pk] = weight
+
+    def remove(self, pk):
+        for term in self.documents.pop(pk, ()):
+            postings = self.postings[term]
+            postings.pop(pk, None)
+            if not postings:
+                del self.postings[term]
+
+    def rebuild(self, version):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        for pk, weights in self.load():
+            self.add(pk, weights)
+        self.version = version
+
+    def ensure_fresh(self):
+        version = get_version(RECIPE_SEARCH_VERSION)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.rebuild(version)
+
+    def update(self, recipe_ids=None):
+        with self.lock:
+            fresh = self.version == get_version(RECIPE_SEARCH_VERSION)
+            version = bump_version(RECIPE_SEARCH_VERSION)
+            if not fresh or recipe_ids is None:
+                return
+            recipe_ids = set(recipe_ids)
+            for pk in recipe_ids:
+                self.remove(pk)
+            for pk, weights in self.load(recipe_ids):
+                self.add(pk, weights)
+            self.version = version
+
+    def search(self, value, limit):
+        """ Не более limit пар (id рецепта, релевантность), в которых
+        встречаются все слова запроса, от более релевантных.
+        """
+        self.ensure_fresh()
+        terms = set(tokenize(value))
+        if not terms:
+            return []
+        with self.lock:
+            postings = sorted(
+                (self.postings.get(term, {}) for term in terms), key=len
+            )
+            scores = dict(postings[0])
+            for other in postings[1:]:
+                scores = {
+                    pk: score + other[pk]
+                    for pk, score in scores.items() if pk in other
+                }
+        return heapq.nlargest(limit, scores.items(), key=itemgetter(1, 0))
+
+
+class RecipeIngredientOverlay(namedtuple(
+    'RecipeIngredientOverlay', 'recipes postings'
+)):
+    """ Рецепты, изменённые после построения основного индекса:
+    recipes — {id: (запись журнала, всего ингредиентов, ингредиенты)},
+    postings — {ингредиент: {id: всего ингредиентов}}. Не изменяется:
+    обновление создаёт новый объект, и поиск читает его без блокировки.
+    """
+
+    def update(self, changes):
+        recipes = dict(self.recipes)
+        recipes.update(changes)
+        return self.from_recipes(recipes)
+
+    def after(self, position):
+        return self.from_recipes({
+            pk: entry for pk, entry in self.recipes.items()
+            if entry[0] > position
+        })
+
+    @classmethod
+    def from_recipes(cls, recipes):
+        postings = defaultdict(dict)
+        for pk, (_, total, ingredient_ids) in recipes.items():
+            for ingredient_id in ingredient_ids:
+                postings[ingredient_id][pk] = total
+        return cls(recipes, dict(postings))
+
+
+class RecipeIngredientIndex:
+    """ Обратный индекс ингредиент -> рецепты в памяти процесса для
+    подбора рецептов по имеющимся ингредиентам. Рецепты каждого
+    ингредиента хранятся в array('I'), сгруппированными по числу
+    ингредиентов рецепта (Recipe.ingredients_count): доля имеющихся
+    ингредиентов в группе из total ингредиентов не больше
+    min(q, total) / total, поэтому группы просматриваются по
+    возрастанию total, пока они могут улучшить ответ.
+    Изменённые рецепты процесс дочитывает из журнала
+    RecipeIngredientsChange в наложение поверх основного индекса.
+    Основной индекс перестраивается целиком в фоне (до конца
+    перестройки запросы обслуживает прежний): при первом запросе,
+    после загрузки дампа, при переполнении наложения и если журнал
+    не читался дольше половины срока его хранения.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.update_lock = Lock()
+        self.rebuilding = False
+        self.postings = {}
+        self.overlay = RecipeIngredientOverlay.from_recipes({})
+        self.position = None
+        self.applied = set()
+        self.checked = None
+
+    def rebuild(self):
+        try:
+            position = settled_journal_position()
+            totals = array('H')
+            for pk, total in Recipe.objects.order_by().values_list(
+                'id', 'ingredients_count'
+            ).iterator(chunk_size=10000):
+                if pk >= len(totals):
+                    totals.extend([0] * (pk + 1 - len(totals)))
+                totals[pk] = total
+            postings = defaultdict(lambda: defaultdict(lambda: array('I')))
+            for ingredient_id, recipe_id in (
+                AmountOfIngredient.objects.order_by().values_list(
+                    'ingredient_id', 'recipe_id'
+                ).iterator(chunk_size=10000)
+            ):
+                # Рецепты, созданные после чтения totals, попадут
+                # в индекс из журнала.
+                if recipe_id < len(totals) and totals[recipe_id]:
+                    postings[ingredient_id][totals[recipe_id]].append(
+                        recipe_id
+                    )
+            with self.update_lock:
+                self.postings = {
+                    ingredient_id: dict(groups)
+                    for ingredient_id, groups in postings.items()
+                }
+                # Изменения до position уже в основном индексе.
+                self.overlay = self.overlay.after(position)
+                self.position = max(self.position or 0, position)
+                self.checked = monotonic()
+        finally:
+            self.rebuilding = False
+
+    def schedule_rebuild(self):
+        with self.lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+        run_in_background(self.rebuild)
+
+    def apply(self, changes):
+        """ Перечитывает ингредиенты рецептов из записей журнала
+        changes ((id записи, id рецепта), ...) в наложение.
+        """
+        entries = {pk: change_id for change_id, pk in changes}
+        if not entries:
+            return
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in AmountOfIngredient.objects.filter(
+            recipe_id__in=entries
+        ).order_by().values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].append(ingredient_id)
+        self.overlay = self.overlay.update({
+            pk: (change_id, len(ingredients[pk]), tuple(ingredients[pk]))
+            for pk, change_id in entries.items()
+        })
+
+    def ensure_fresh(self):
+        if self.position is None:
+            with self.lock:
+                if self.position is None:
+                    self.rebuilding = True
+                    self.rebuild()
+            return
+        with self.update_lock:
+            stale = (monotonic() - self.checked
+                     > settings.RECIPE_INGREDIENT_JOURNAL_RETENTION / 2)
+            self.checked = monotonic()
+            changes = list(RecipeIngredientsChange.objects.filter(
+                id__gt=self.position
+            ).order_by('id').values_list('id', 'recipe_id', 'created'))
+            self.apply([
+                (change_id, pk) for change_id, pk, _ in changes
+                if pk is not None and change_id not in self.applied
+            ])
+            # Запись может стать видна позже записей с большим id,
+            # поэтому позиция сдвигается только за устоявшиеся записи,
+            # а свежие перечитываются, но применяются один раз.
+            settled = journal_settled_before()
+            for change_id, _, created in changes:
+                if created > settled:
+                    break
+                self.position = change_id
+            self.applied = {
+                change_id for change_id, _, _ in changes
+                if change_id > self.position
+            }
+        if (stale or len(self.overlay.recipes)
+                > settings.RECIPE_INGREDIENT_INDEX_OVERLAY
+                or any(pk is None for _, pk, _ in changes)):
+            self.schedule_rebuild()
+
+    def search(self, ingredient_ids, limit):
+        """ Не более limit троек (id рецепта, число имеющихся
+        ингредиентов, всего ингредиентов) по убыванию доли имеющихся.
+        """
+        self.ensure_fresh()
+        postings, overlay = self.postings, self.overlay
+        ingredient_ids = set(ingredient_ids)
+        groups = [
+            postings[ingredient_id] for ingredient_id in ingredient_ids
+            if ingredient_id in postings
+        ]
+        changed = defaultdict(Counter)
+        for ingredient_id in ingredient_ids:
+            for pk, total in overlay.postings.get(ingredient_id, {}).items():
+                changed[total][pk] += 1
+        query_size = len([
+            ingredient_id for ingredient_id in ingredient_ids
+            if ingredient_id in postings or ingredient_id in overlay.postings
+        ])
+        top = []
+        for total in sorted(set(changed).union(*groups)):
+            if (len(top) == limit
+                    and top[0][0] >= min(query_size, total) / total):
+                break
+            matched = Counter()
+            for group in groups:
+                matched.update(group.get(total, ()))
+            for pk in overlay.recipes.keys() & matched.keys():
+                del matched[pk]
+            matched.update(changed.get(total, {}))
+            for pk, hits in heapq.nlargest(
+                limit, matched.items(), key=itemgetter(1, 0)
+            ):
+                # Индекс строится из двух таблиц не одним снимком,
+                # и hits может превысить устаревший total.
+                item = (min(hits / total, 1.0), hits, pk, max(total, hits))
+                if len(top) < limit:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+                else:
+                    break
+        return [
+            (pk, hits, total)
+            for _, hits, pk, total in sorted(top, reverse=True)
+        ]
+
+
+recipe_index = RecipeSearchIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def journal_settled_before():
+    return timezone.now() - JOURNAL_SETTLE_TIME
+
+
+def settled_journal_position():
+    """ Последняя запись журнала, раньше которой новые уже не появятся. """
+    return RecipeIngredientsChange.objects.filter(
+        created__lte=journal_settled_before()
+    ).aggregate(position=Max('id'))['position'] or 0
+
+
+def log_recipe_ingredient_changes(recipe_ids):
+    """ Записывает в журнал изменённые рецепты recipe_ids
+    (None — изменились все) и удаляет устаревшие записи.
+    """
+    if recipe_ids is None:
+        recipe_ids = [None]
+    RecipeIngredientsChange.objects.bulk_create([
+        RecipeIngredientsChange(recipe_id=pk) for pk in set(recipe_ids)
+    ])
+    RecipeIngredientsChange.objects.filter(created__lt=timezone.now() - (
+        timedelta(seconds=settings.RECIPE_INGREDIENT_JOURNAL_RETENTION)
+    )).delete()
+
+
+def recipe_ingredients_changed(recipe_ids):
+    """ После коммита отмечает в журнале изменение ингредиентов
+    рецептов recipe_ids (None — всех рецептов).
+    """
+    run_after_commit(log_recipe_ingredient_changes, recipe_ids)
@@ -1,16 +1,23 @@
 from django.contrib.auth import get_user_model
-from django.db.models import F
-from drf_extra_fields.fields import Base64ImageField
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Case, PositiveSmallIntegerField, Value, When
 from rest_framework import serializers, validators
 
+from foodgram.metrics import SerializationTimingMixin
+
+from .counters import change_counter
+from .fields import ImageVariantField, LimitedImageField, PrimaryKeyListField
 from .models import (
     AmountOfIngredient,
     Favorite,
     Ingredient,
     Recipe,
     ShoppingCart,
+    ShoppingCartTotal,
     Tag,
 )
+from .search import recipe_ingredients_changed
 from users.serializers import UserSerializer
 
 MIN_INGREDIENT = 'Должен быть хотя бы один ингредиент в рецепте'
@@ -26,19 +33,22 @@ ALREADY_ADD_RECIPE = 'Вы уже добавили этот рецепт'
 User = get_user_model()
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SerializationTimingMixin,
+                    serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SerializationTimingMixin,
+                           serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
 
 
-class IngredientRecipeSerializer(serializers.ModelSerializer):
+class IngredientRecipeSerializer(SerializationTimingMixin,
+                                 serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
@@ -51,7 +61,7 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -59,28 +69,34 @@ class AddIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SerializationTimingMixin,
+                       serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_thumb = ImageVariantField()
+    image_webp = ImageVariantField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_thumb',
+            'image_webp', 'text', 'cooking_time', 'favorites_count'
         )
 
     def get_ingredients(self, obj):
-        ingredients = AmountOfIngredient.objects.filter(recipe=obj)
+        ingredients = obj.amount_recipe.all()
         return IngredientRecipeSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return Favorite.objects.filter(
             user=request.user, recipe=obj
         ).exists()
@@ -89,17 +105,19 @@ class RecipeSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return ShoppingCart.objects.filter(
             user=request.user, recipe=obj
         ).exists()
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(SerializationTimingMixin,
+                             serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True)
+    tags = PrimaryKeyListField(queryset=Tag.objects.all())
     ingredients = AddIngredientSerializer(many=True)
-    image = Base64ImageField()
+    image = LimitedImageField()
     cooking_time = serializers.IntegerField()
 
     class Meta:
@@ -110,14 +128,18 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def validate_ingredients(self, value):
         if not value:
             raise serializers.ValidationError(MIN_INGREDIENT)
-        ingredients_set = []
+        ingredients_set = set()
         for ingredient in value:
             if int(ingredient['amount']) <= 0:
                 raise serializers.ValidationError(MIN_AMOUNT)
             if ingredient['id'] in ingredients_set:
                 raise serializers.ValidationError(DOUBLE_INGREDIENT)
-            else:
-                ingredients_set.append(ingredient['id'])
+            ingredients_set.add(ingredient['id'])
+        existing = Ingredient.objects.filter(
+            id__in=ingredients_set
+        ).count()
+        if existing != len(ingredients_set):
+            raise serializers.ValidationError(NO_INGREDIENT)
         return value
 
     def validate_tags(self, value):
@@ -136,41 +158,114 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return value
 
     def to_representation(self, instance):
-        serializer = RecipeSerializer(instance)
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_flags(
+            request and request.user
+        ).get(pk=instance.pk)
+        serializer = RecipeSerializer(instance, context=self.context)
         return serializer.data
 
     def add_ingredients_in_recipe(self, recipe, ingredients):
-        for item in ingredients:
-            item_id = item['id']
-            amount = item['amount']
-            if AmountOfIngredient.objects.filter(recipe=recipe,
-                                                 ingredient=item_id).exists():
-                amount += F('amount')
-            AmountOfIngredient.objects.update_or_create(
-                recipe=recipe, ingredient=item_id,
-                defaults={'amount': amount}
-            )
-
+        """ bulk_create не вызывает сигналы, поэтому ingredients_count
+        увеличивается, а рецепт записывается в журнал индекса здесь.
+        """
+        AmountOfIngredient.objects.bulk_create(
+            AmountOfIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                               amount=amount)
+            for ingredient_id, amount in ingredients.items()
+        )
+        change_counter(Recipe, recipe.id, 'ingredients_count',
+                       len(ingredients))
+        if ingredients:
+            recipe_ingredients_changed([recipe.id])
+
+    def update_ingredients_in_recipe(self, recipe, ingredients):
+        """ Сравнивает новые ингредиенты с сохранёнными и изменяет
+        только отличающиеся строки. Удалённые строки переносятся
+        в итоги списков покупок сигналами, а добавленные и изменённые
+        (bulk_create и update сигналов не вызывают) — здесь.
+        """
+        old_amounts = AmountOfIngredient.objects.amounts(recipe.id)
+        removed = old_amounts.keys() - ingredients.keys()
+        added = {
+            ingredient_id: amount
+            for ingredient_id, amount in ingredients.items()
+            if ingredient_id not in old_amounts
+        }
+        changed = {
+            ingredient_id: amount
+            for ingredient_id, amount in ingredients.items()
+            if old_amounts.get(ingredient_id, amount) != amount
+        }
+        if removed:
+            AmountOfIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        if changed:
+            AmountOfIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=changed
+            ).update(amount=Case(
+                *[When(ingredient_id=key, then=Value(value))
+                  for key, value in changed.items()],
+                output_field=PositiveSmallIntegerField(),
+            ))
+        self.add_ingredients_in_recipe(recipe, added)
+        ShoppingCartTotal.objects.add_recipe_amounts(recipe.id, {
+            ingredient_id: amount - old_amounts.get(ingredient_id, 0)
+            for ingredient_id, amount in ingredients.items()
+        })
+
+    @staticmethod
+    def get_amounts(ingredients):
+        return {item['id']: item['amount'] for item in ingredients}
+
+    def save(self, **kwargs):
+        """ Закрывает временный файл картинки после сохранения. """
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if isinstance(image, UploadedFile):
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(image=image, **validated_data)
-        recipe.tags.set(tags)
-        self.add_ingredients_in_recipe(recipe, ingredients)
+        recipe.tags.add(*tags)
+        self.add_ingredients_in_recipe(recipe, self.get_amounts(ingredients))
         return recipe
 
+    @transaction.atomic
     def update(self, instanse, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        AmountOfIngredient.objects.filter(recipe=instanse).delete()
-        self.add_ingredients_in_recipe(instanse, ingredients)
-        instanse.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.update_ingredients_in_recipe(
+                instanse, self.get_amounts(ingredients)
+            )
+        if tags is not None:
+            instanse.tags.set(tags)
         super().update(instanse, validated_data)
         return instanse
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class CookRecipeSerializer(RecipeSerializer):
+    """ Рецепт в подборке по имеющимся ингредиентам: доля
+    имеющихся ингредиентов и число недостающих.
+    """
+
+    coverage = serializers.FloatField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('coverage', 'missing_count')
+
+
+class FavoriteSerializer(SerializationTimingMixin,
+                         serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
 
@@ -187,7 +282,8 @@ class FavoriteSerializer(serializers.ModelSerializer):
         ]
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class ShoppingCartSerializer(SerializationTimingMixin,
+                             serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
 
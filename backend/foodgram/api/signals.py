@@ -0,0 +1,279 @@
+from collections import defaultdict
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .cache import RESPONSE_EPOCH, bump_version, invalidate_responses
+from .counters import change_counter
+from .feed import add_author_to_feed, fan_out_recipe, remove_author_from_feed
+from .images import process_recipe_image
+from .models import (
+    AmountOfIngredient,
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShoppingCartTotal,
+    Tag,
+)
+from .search import (
+    recipe_ingredients_changed,
+    update_ingredient_search_vectors,
+    update_search_vectors,
+)
+from .tasks import run_after_commit
+from users.models import Follow
+
+User = get_user_model()
+
+
+def invalidate_on_commit(*names):
+    """ Сбрасывает ответы после коммита: иначе параллельный запрос
+    успеет сохранить в кэш старые данные под новой версией.
+    """
+    transaction.on_commit(partial(invalidate_responses, *names))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_cart_total(sender, instance, created, **kwargs):
+    if created:
+        ShoppingCartTotal.objects.add_amounts(
+            [instance.user_id],
+            AmountOfIngredient.objects.amounts(instance.recipe_id)
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_recipe_from_cart_total(sender, instance, **kwargs):
+    """ post_delete, как и у AmountOfIngredient: при удалении рецепта
+    его ингредиенты и списки покупок удаляются в любом порядке,
+    и вычитает только тот сигнал, что сработал первым.
+    """
+    amounts = AmountOfIngredient.objects.amounts(instance.recipe_id)
+    ShoppingCartTotal.objects.add_amounts(
+        [instance.user_id],
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()}
+    )
+
+
+@receiver(pre_save, sender=AmountOfIngredient)
+def remember_saved_amount(sender, instance, **kwargs):
+    instance._saved_amount = None
+    if instance.pk is not None:
+        instance._saved_amount = AmountOfIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=AmountOfIngredient)
+def update_cart_totals_on_amount_save(sender, instance, **kwargs):
+    """ Правки ингредиентов рецепта через ORM (например, в админке)
+    переносятся в итоги списков покупок с этим рецептом.
+    """
+    amounts = defaultdict(lambda: defaultdict(int))
+    saved = instance._saved_amount
+    if saved is not None:
+        recipe_id, ingredient_id, amount = saved
+        amounts[recipe_id][ingredient_id] -= amount
+    amounts[instance.recipe_id][instance.ingredient_id] += instance.amount
+    for recipe_id, delta in amounts.items():
+        ShoppingCartTotal.objects.add_recipe_amounts(recipe_id, delta)
+
+
+@receiver(post_delete, sender=AmountOfIngredient)
+def update_cart_totals_on_amount_delete(sender, instance, **kwargs):
+    ShoppingCartTotal.objects.add_recipe_amounts(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+def counter_delta(created):
+    """ Изменение счётчика по сигналу: post_save новой строки — +1,
+    post_delete (created нет) — -1, повторное сохранение — 0.
+    """
+    if created is None:
+        return -1
+    return 1 if created else 0
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def count_favorites(sender, instance, created=None, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count',
+                   counter_delta(created))
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def count_shopping_carts(sender, instance, created=None, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'shopping_cart_count',
+                   counter_delta(created))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_followers(sender, instance, created=None, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count',
+                   counter_delta(created))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def count_recipes(sender, instance, created=None, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count',
+                   counter_delta(created))
+
+
+@receiver(post_save, sender=AmountOfIngredient)
+@receiver(post_delete, sender=AmountOfIngredient)
+def count_ingredients(sender, instance, created=None, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'ingredients_count',
+                   counter_delta(created))
+
+
+@receiver(post_save, sender=AmountOfIngredient)
+@receiver(post_delete, sender=AmountOfIngredient)
+def log_recipe_ingredients_change(sender, instance, **kwargs):
+    """ Индекс подбора рецептов дочитывает изменённые рецепты
+    из журнала. Удаление рецепта удаляет и его ингредиенты, а строки,
+    добавленные через bulk_create, записывает в журнал
+    RecipeCreateSerializer.add_ingredients_in_recipe.
+    """
+    recipe_ids = {instance.recipe_id}
+    saved = getattr(instance, '_saved_amount', None)
+    if saved is not None:
+        recipe_ids.add(saved[0])
+    recipe_ingredients_changed(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, 'ingredients'))
+    invalidate_on_commit(RESPONSE_EPOCH)
+
+
+@receiver(post_save, sender=Ingredient)
+def index_renamed_ingredient(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(
+            partial(update_ingredient_search_vectors, instance.pk)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    """ Индекс обновляется после коммита, когда ингредиенты
+    рецепта уже сохранены.
+    """
+    transaction.on_commit(partial(update_search_vectors, [instance.pk]))
+
+
+@receiver(post_save, sender=AmountOfIngredient)
+@receiver(post_delete, sender=AmountOfIngredient)
+def index_recipe_ingredients(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(update_search_vectors, [instance.recipe_id])
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, 'tags'))
+    invalidate_on_commit(RESPONSE_EPOCH)
+
+
+@receiver(pre_save, sender=Recipe)
+def reset_image_variants(sender, instance, **kwargs):
+    """ Новая картинка ещё не сохранена в хранилище: старые
+    варианты больше не подходят, до обработки отдаётся оригинал.
+    """
+    instance._image_changed = instance.has_new_image()
+    if instance._image_changed:
+        instance.image_thumb = instance.image_webp = ''
+
+
+@receiver(post_save, sender=Recipe)
+def process_image_variants(sender, instance, **kwargs):
+    if getattr(instance, '_image_changed', False):
+        run_after_commit(process_recipe_image, instance.pk)
+
+
+def recipe_cache_keys(recipe, tag_slugs=None):
+    """ Рецепт, выборки, в которые он попадает, и общая лента. """
+    if tag_slugs is None:
+        tag_slugs = recipe.tags.values_list('slug', flat=True)
+    return (f'recipe:{recipe.pk}', f'author:{recipe.author_id}', 'recipes',
+            *(f'tag:{slug}' for slug in tag_slugs))
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, created, **kwargs):
+    invalidate_on_commit(*recipe_cache_keys(
+        instance, tag_slugs=[] if created else None
+    ))
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    invalidate_on_commit(*recipe_cache_keys(instance))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        invalidate_on_commit(RESPONSE_EPOCH)
+        return
+    tag_slugs = []
+    if action == 'post_add':
+        tag_slugs = Tag.objects.filter(
+            pk__in=pk_set
+        ).values_list('slug', flat=True)
+    invalidate_on_commit(*recipe_cache_keys(instance, tag_slugs))
+
+
+@receiver(post_save, sender=AmountOfIngredient)
+@receiver(post_delete, sender=AmountOfIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    invalidate_on_commit(f'recipe:{instance.recipe_id}')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_on_commit(f'user:{instance.pk}')
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_created_recipe(sender, instance, created, **kwargs):
+    if created:
+        run_after_commit(fan_out_recipe, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        run_after_commit(add_author_to_feed, instance.user_id,
+                         instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_unfollowed_author_from_feed(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        remove_author_from_feed, instance.user_id, instance.author_id
+    ))
@@ -0,0 +1,78 @@
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = re.compile(
+    r'(?:ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(?:в|вши|вшись))$'
+)
+REFLEXIVE = re.compile(r'(?:ся|сь)$')
+ADJECTIVAL = re.compile(
+    r'(?:ивш|ывш|ующ|(?<=[ая])(?:ем|нн|вш|ющ|щ))?'
+    r'(?:ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому'
+    r'|их|ых|ую|юю|ая|яя|ою|ею)$'
+)
+VERB = re.compile(
+    r'(?:ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю'
+    r'|(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$'
+)
+NOUN = re.compile(
+    r'(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием'
+    r'|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'(?:ост|ость)$')
+SUPERLATIVE = re.compile(r'(?:ейш|ейше)$')
+
+
+def _regions(word):
+    """ Начала областей RV и R2 алгоритма Snowball. """
+    rv = r1 = r2 = len(word)
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and rv == len(word):
+            rv = index
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _cut(pattern, word):
+    match = pattern.search(word)
+    if match is None:
+        return word, False
+    return word[:match.start()], True
+
+
+def stem(word):
+    """ Основа русского слова по алгоритму Snowball (Russian stemmer):
+    окончания отсекаются только в области RV, словообразовательные
+    суффиксы — в R2. Слово должно быть в нижнем регистре, без «ё».
+    """
+    rv, r2 = _regions(word)
+    head, tail = word[:rv], word[rv:]
+
+    tail, found = _cut(PERFECTIVE_GERUND, tail)
+    if not found:
+        tail, _ = _cut(REFLEXIVE, tail)
+        for pattern in (ADJECTIVAL, VERB, NOUN):
+            tail, found = _cut(pattern, tail)
+            if found:
+                break
+
+    if tail.endswith('и'):
+        tail = tail[:-1]
+
+    match = DERIVATIONAL.search(tail)
+    if match is not None and rv + match.start() >= r2:
+        tail = tail[:match.start()]
+
+    tail, found = _cut(SUPERLATIVE, tail)
+    if tail.endswith('нн'):
+        tail = tail[:-1]
+    elif not found and tail.endswith('ь'):
+        tail = tail[:-1]
+    return head + tail
@@ -0,0 +1,51 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='foodgram-tasks',
+            )
+    return _executor
+
+
+def _run(function, args, in_worker):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Background task %s%r failed',
+                         function.__name__, args)
+    finally:
+        if in_worker:
+            connections.close_all()
+
+
+def run_in_background(function, *args):
+    """ Выполняет function в пуле потоков процесса.
+    При BACKGROUND_WORKERS = 0 выполняет сразу.
+    """
+    if not settings.BACKGROUND_WORKERS:
+        _run(function, args, in_worker=False)
+        return
+    get_executor().submit(_run, function, args, True)
+
+
+def run_after_commit(function, *args):
+    """ Запускает задачу после коммита текущей транзакции,
+    чтобы она увидела сохранённые данные.
+    """
+    transaction.on_commit(partial(run_in_background, function, *args))
@@ -0,0 +1,487 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .checks import check_version_cache
+from .feed import add_author_to_feed, rebuild_feeds
+from .importers import read_json
+from .models import (
+    AmountOfIngredient,
+    Favorite,
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from .parsers import ImageScanner, PayloadTooLarge, RecipeJSONParser
+from .renderers import ShoppingListPDFRenderer
+from .search import RecipeIngredientIndex, log_recipe_ingredient_changes
+from users.models import Follow
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+RECIPES_URL = '/api/recipes/'
+
+
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (20, 20), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, BACKGROUND_WORKERS=0)
+class RecipeQueriesTest(TestCase):
+
+    """ Число запросов к базе у списка, страницы и создания рецепта
+    не зависит от числа рецептов, тегов и ингредиентов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@foodgram.ru', password='pass',
+            first_name='Повар', last_name='Поваров',
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}',
+                               color=f'#00000{index}')
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(5)
+        ]
+        for index in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/test.png',
+            )
+            recipe.tags.set(cls.tags)
+            AmountOfIngredient.objects.bulk_create(
+                AmountOfIngredient(recipe=recipe, ingredient=ingredient,
+                                   amount=index + 1)
+                for ingredient in cls.ingredients
+            )
+        cls.recipe = recipe
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for limit in (2, 10):
+            with self.subTest(limit=limit), self.assertNumQueries(5):
+                response = self.client.get(RECIPES_URL, {'limit': limit})
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_retrieve_queries(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(f'{RECIPES_URL}{self.recipe.id}/')
+        self.assertEqual(len(response.data['ingredients']), 5)
+
+    def test_create_queries_do_not_depend_on_tags_and_ingredients(self):
+        for count in (1, 3):
+            data = {
+                'name': f'Новый рецепт {count}',
+                'text': 'Текст',
+                'cooking_time': 5,
+                'image': image_base64(),
+                'tags': [tag.id for tag in self.tags[:count]],
+                'ingredients': [{'id': ingredient.id, 'amount': 10}
+                                for ingredient in self.ingredients[:count]],
+            }
+            with self.subTest(count=count), self.assertNumQueries(15):
+                response = self.client.post(RECIPES_URL, data, format='json')
+                self.assertEqual(response.status_code, 201, response.data)
+
+
+@override_settings(BACKGROUND_WORKERS=0, FEED_PULL_FOLLOWERS=1)
+class FeedTest(TestCase):
+
+    """ Лента сливает разосланные рецепты с рецептами авторов
+    с feed_pull и не хранит записи отписавшихся.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author, cls.star, cls.fan = (
+            User.objects.create_user(
+                username=name, email=f'{name}@foodgram.ru', password='pass',
+            )
+            for name in ('reader', 'author', 'star', 'fan')
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=(cls.author, cls.star)[index % 2],
+                name=f'Рецепт {index}', text='Текст', cooking_time=10,
+                image='recipes/test.png',
+            )
+            for index in range(7)
+        ]
+        for user, author in ((cls.reader, cls.author),
+                             (cls.reader, cls.star), (cls.fan, cls.star)):
+            Follow.objects.create(user=user, author=author)
+        rebuild_feeds()
+
+    def feed_ids(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        ids, url = [], '/api/recipes/feed/?limit=3'
+        while url:
+            response = client.get(url).json()
+            ids += [recipe['id'] for recipe in response['results']]
+            url = response['next']
+        return ids
+
+    def test_rebuild_splits_push_and_pull_authors(self):
+        self.assertTrue(User.objects.get(pk=self.star.pk).feed_pull)
+        self.assertEqual(
+            set(FeedEntry.objects.values_list('recipe__author', flat=True)),
+            {self.author.id}
+        )
+
+    def test_feed_merges_pushed_and_pulled_recipes(self):
+        self.assertEqual(self.feed_ids(),
+                         [recipe.id for recipe in reversed(self.recipes)])
+
+    def test_backfill_after_unfollow_adds_nothing(self):
+        Follow.objects.create(user=self.fan, author=self.author).delete()
+        add_author_to_feed(self.fan.id, self.author.id)
+        self.assertFalse(FeedEntry.objects.filter(user=self.fan).exists())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, BACKGROUND_WORKERS=0)
+class ShoppingCartTotalsTest(TestCase):
+
+    """ Итоги списков покупок совпадают с пересчитанными после любых
+    правок ингредиентов: через API, ORM (админку) и удаление рецепта.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@foodgram.ru', password='pass',
+        )
+        cls.tag = Tag.objects.create(name='Тег', slug='tag', color='#000000')
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(4)
+        ]
+        cls.recipes = []
+        for index in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/test.png',
+            )
+            recipe.tags.set([cls.tag])
+            for ingredient in cls.ingredients[:3]:
+                AmountOfIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+            cls.recipes.append(recipe)
+
+    def assertTotalsConsistent(self):
+        call_command('rebuild_shopping_cart_totals', '--verify',
+                     stdout=io.StringIO())
+
+    def test_orm_edits(self):
+        recipe = self.recipes[0]
+        amount = recipe.amount_recipe.get(ingredient=self.ingredients[0])
+        amount.amount = 25
+        amount.save()
+        self.assertTotalsConsistent()
+        amount.ingredient = self.ingredients[3]
+        amount.save()
+        self.assertTotalsConsistent()
+        AmountOfIngredient.objects.create(
+            recipe=recipe, ingredient=self.ingredients[0], amount=5
+        )
+        self.assertTotalsConsistent()
+        recipe.amount_recipe.get(ingredient=self.ingredients[1]).delete()
+        self.assertTotalsConsistent()
+
+    def test_api_update(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.patch(f'{RECIPES_URL}{self.recipes[0].id}/', {
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 10},
+                {'id': self.ingredients[1].id, 'amount': 30},
+                {'id': self.ingredients[3].id, 'amount': 7},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTotalsConsistent()
+
+    def test_recipe_and_cart_deletion(self):
+        self.recipes[0].delete()
+        self.assertTotalsConsistent()
+        ShoppingCart.objects.get(recipe=self.recipes[1]).delete()
+        self.assertTotalsConsistent()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, BACKGROUND_WORKERS=0)
+class RecipeImageVariantsTest(TestCase):
+
+    """ Сохранение устаревшего объекта не стирает варианты картинки,
+    записанные фоновой обработкой, а смена картинки сбрасывает их.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@foodgram.ru', password='pass',
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст', cooking_time=10,
+            image='recipes/test.png',
+        )
+
+    def setUp(self):
+        self.stale = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image_thumb='recipes/thumbs/test.jpeg',
+            image_webp='recipes/webp/test.webp',
+        )
+
+    def variants(self):
+        return Recipe.objects.filter(pk=self.recipe.pk).values_list(
+            'image_thumb', 'image_webp'
+        ).get()
+
+    def test_stale_save_keeps_variants(self):
+        self.stale.name = 'Новое название'
+        self.stale.save()
+        self.assertEqual(self.variants(), ('recipes/thumbs/test.jpeg',
+                                           'recipes/webp/test.webp'))
+
+    def test_new_image_resets_variants(self):
+        self.stale.image = ContentFile(
+            base64.b64decode(image_base64().split(',')[1]), name='new.png'
+        )
+        self.stale.save()
+        self.assertEqual(self.variants(), ('', ''))
+
+
+@override_settings(BACKGROUND_WORKERS=0)
+class RecipeIngredientIndexTest(TestCase):
+
+    """ Изменённые рецепты попадают в индекс подбора из журнала
+    без перестройки; запись без рецепта перестраивает индекс.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='chef', email='chef@foodgram.ru', password='pass',
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/test.png',
+            )
+            for index in range(2)
+        ]
+        for recipe in cls.recipes:
+            AmountOfIngredient.objects.create(
+                recipe=recipe, ingredient=cls.ingredients[0], amount=1
+            )
+
+    def setUp(self):
+        self.index = RecipeIngredientIndex()
+        self.index.search([self.ingredients[0].id], 10)
+        self.rebuilds = 0
+        rebuild = self.index.rebuild
+
+        def counted_rebuild():
+            self.rebuilds += 1
+            rebuild()
+
+        self.index.rebuild = counted_rebuild
+
+    def search(self, *ingredients):
+        return self.index.search(
+            [ingredient.id for ingredient in ingredients], 10
+        )
+
+    def test_changed_recipes_are_applied_incrementally(self):
+        first, second = self.recipes
+        AmountOfIngredient.objects.create(
+            recipe=first, ingredient=self.ingredients[1], amount=1
+        )
+        deleted_id = second.id
+        second.delete()
+        log_recipe_ingredient_changes([first.id, deleted_id])
+        self.assertEqual(self.search(*self.ingredients[:2]),
+                         [(first.id, 2, 2)])
+        self.assertEqual(self.search(self.ingredients[0]),
+                         [(first.id, 1, 2)])
+        self.assertEqual(self.rebuilds, 0)
+
+    def test_full_change_rebuilds(self):
+        log_recipe_ingredient_changes(None)
+        self.search(self.ingredients[0])
+        self.assertEqual(self.rebuilds, 1)
+
+
+class AnonymousCacheTest(TestCase):
+
+    """ Анонимные ответы кэшируются, кроме сортировки по счётчику. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='fan', email='fan@foodgram.ru', password='pass',
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/test.png',
+            )
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        caches['responses'].clear()
+
+    def first_recipe(self, params):
+        return self.client.get(RECIPES_URL, params).json()['results'][0]
+
+    def test_counter_ordering_is_not_cached(self):
+        params = {'ordering': '-favorites_count'}
+        self.first_recipe(params)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        self.assertEqual(self.first_recipe(params)['id'], self.recipes[0].id)
+
+    def test_list_is_cached(self):
+        cached = self.first_recipe({})
+        Favorite.objects.create(user=self.user, recipe=self.recipes[1])
+        self.assertEqual(self.first_recipe({}), cached)
+
+
+class VersionCacheCheckTest(SimpleTestCase):
+
+    """ Кэш версий в памяти процесса не проходит проверку. """
+
+    def test_shared_backend_passes(self):
+        self.assertEqual(check_version_cache(None), [])
+
+    def test_process_local_backend_fails(self):
+        caches = {
+            **settings.CACHES,
+            'versions': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+            },
+        }
+        with override_settings(CACHES=caches):
+            errors = check_version_cache(None)
+        self.assertEqual([error.id for error in errors], ['api.E001'])
+
+
+class ShoppingListPDFTest(TestCase):
+
+    """ Кириллица в PDF набирается встроенным TrueType-шрифтом. """
+
+    def test_pdf_embeds_truetype_font(self):
+        pdf = ShoppingListPDFRenderer().render([
+            {'name': 'Мука', 'measurement_unit': 'г', 'total': 500},
+        ])
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Subtype /TrueType', pdf)
+        self.assertIn(b'/FontFile2', pdf)
+        self.assertIn(b'/ToUnicode', pdf)
+        self.assertNotIn(b'/Type1', pdf)
+
+
+class RecipeJSONParserTest(SimpleTestCase):
+
+    """ Картинка в JSON декодируется при любой нарезке тела на части,
+    в том числе base64 с переносами строк, и ограничена по размеру.
+    """
+
+    def payload(self, size):
+        return os.urandom(size)
+
+    def body(self, content, line_length=76):
+        encoded = base64.b64encode(content).decode()
+        wrapped = '\n'.join(
+            encoded[start:start + line_length]
+            for start in range(0, len(encoded), line_length)
+        )
+        return json.dumps({
+            'name': 'Рецепт', 'image': 'data:image/png;base64,' + wrapped,
+        }).encode()
+
+    def test_wrapped_base64(self):
+        content = self.payload(1000)
+        body = self.body(content)
+        for chunk_size in (1, 2, 7, len(body)):
+            with self.subTest(chunk_size=chunk_size):
+                scanner = ImageScanner('image', len(content))
+                for start in range(0, len(body), chunk_size):
+                    scanner.feed(body[start:start + chunk_size])
+                self.assertEqual(scanner.image.read(), content)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=100)
+    def test_image_over_limit(self):
+        body = self.body(self.payload(101))
+        with self.assertRaises(PayloadTooLarge):
+            RecipeJSONParser().parse(io.BytesIO(body))
+
+
+class ImportIngredientsTest(TestCase):
+
+    """ Повреждённый JSON не читается в память целиком:
+    ошибка сообщает смещение элемента в байтах.
+    """
+
+    def import_json(self, content):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.json', encoding='utf-8', delete=False
+        ) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        call_command('import_ingredients', file.name, stdout=io.StringIO())
+
+    def test_imports_array(self):
+        self.import_json('[{"name": "Мука", "measurement_unit": "г"}]')
+        self.assertTrue(Ingredient.objects.filter(name='Мука').exists())
+
+    def test_malformed_item_reports_byte_offset(self):
+        with self.assertRaisesMessage(CommandError, 'с байта 49'):
+            self.import_json('[{"name": "Мука", "measurement_unit": "г"}, '
+                             '{"name": Соль}]')
+
+    def test_unterminated_item_is_capped(self):
+        items = read_json(io.StringIO('[{"name": "' + 'а' * 5000),
+                          buffer_size=64, max_buffer_size=1000)
+        with self.assertRaisesMessage(ValueError, 'в пределах 1000'):
+            list(items)
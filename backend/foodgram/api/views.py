@@ -1,44 +1,91 @@
-from functools import reduce
-
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import connection
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import permissions, status, viewsets
+from rest_framework import parsers, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from .filters import IngredientFilter, RecipeFilter
-from .mixins import CreateListViewSet
-from .models import Ingredient, Recipe, Tag
-from .paginator import CustomPaginator
+from .filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from .mixins import (
+    AnonymousResponseCacheMixin,
+    CachedListMixin,
+    CreateListViewSet,
+)
+from .models import Ingredient, Recipe, ShoppingCartTotal, Tag
+from .paginator import FeedPaginator, KeysetPaginator
+from .parsers import RecipeJSONParser
 from .permissions import AuthorOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
+from .search import ingredient_index, is_postgresql, recipe_ingredient_index
 from .serializers import (
+    CookRecipeSerializer,
     FavoriteSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
     RecipeSerializer,
     TagSerializer,
 )
+from users.mixins import SubscriptionsContextMixin
 
 ALREADY_ADD_RECIPE = 'Этот рецепт уже добавлен'
 ERROR_ADD_RECIPE = 'Этот рецепт не был добавлен'
-TITLE = 'Ваш список покупок:\n\n'
+NO_INGREDIENTS = 'Укажите id имеющихся ингредиентов: ?ingredients=1&...'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, SubscriptionsContextMixin,
+                    viewsets.ModelViewSet):
 
     """ Страница со всеми рецептами с паджинацией по 6 рецептов на странице.
     Сортировка от новых к старым.
     Страница доступна всем пользователям.
-    Доступна фильтрация по избранному, автору, списку покупок и тегам.
+    Доступна фильтрация по избранному, автору, списку покупок и тегам
+    и сортировка по популярности (?ordering=-favorites_count).
     Методы GET, POST, PATCH, DELETE.
     """
 
     queryset = Recipe.objects.all()
-    pagination_class = CustomPaginator
+    pagination_class = KeysetPaginator
+    parser_classes = (RecipeJSONParser, parsers.FormParser,
+                      parsers.MultiPartParser)
     permission_classes = (AuthorOrReadOnly,)
     filter_class = RecipeFilter
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            queryset = queryset.with_related().with_user_flags(
+                self.request.user
+            )
+        return queryset
+
+    def cacheable(self):
+        """ Порядок по счётчику меняется с каждым добавлением
+        в избранное, такие списки не кэшируются.
+        """
+        ordering = self.request.query_params.get('ordering', '')
+        return 'favorites_count' not in ordering
+
+    def cache_scope(self):
+        if self.action == 'retrieve':
+            return [f'recipe:{self.kwargs["pk"]}']
+        params = self.request.query_params
+        if params.get('author'):
+            return [f'author:{params["author"]}']
+        tags = [slug for slug in params.getlist('tags') if slug]
+        if tags:
+            return [f'tag:{slug}' for slug in tags]
+        return ['recipes']
+
+    def response_dependencies(self, data):
+        recipes = data.get('results', [data])
+        return [
+            dependency
+            for recipe in recipes
+            for dependency in (f'recipe:{recipe["id"]}',
+                               f'user:{recipe["author"]["id"]}')
+        ]
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -47,8 +94,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'feed']:
             return RecipeSerializer
+        if self.action == 'cook':
+            return CookRecipeSerializer
         return RecipeCreateSerializer
 
     def _add_recipe_in(self, request, related_manager):
@@ -79,38 +128,74 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._add_recipe_in(request, request.user.shopping_cart_user)
 
     @action(permission_classes=[permissions.IsAuthenticated],
+            pagination_class=FeedPaginator,
+            methods=['GET'],
+            detail=False)
+    def feed(self, request):
+        """ Новые рецепты авторов из подписок, по курсору. """
+        page = self.paginate_queryset(
+            Recipe.objects.with_related().with_user_flags(request.user)
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_cook_limit(self):
+        limit = self.request.query_params.get('limit', '')
+        if not limit.isdigit():
+            return settings.COOK_RESULTS
+        return min(max(int(limit), 1), settings.COOK_MAX_RESULTS)
+
+    @action(methods=['GET'], detail=False)
+    def cook(self, request):
+        """ Что приготовить из имеющихся ингредиентов
+        (?ingredients=id&ingredients=id): рецепты по убыванию доли
+        имеющихся ингредиентов среди всех ингредиентов рецепта.
+        """
+        ingredient_ids = [
+            int(value) for value in request.query_params.getlist(
+                'ingredients'
+            ) if value.isdigit()
+        ]
+        if not ingredient_ids:
+            return Response(NO_INGREDIENTS,
+                            status=status.HTTP_400_BAD_REQUEST)
+        ranked = recipe_ingredient_index.search(
+            ingredient_ids, self.get_cook_limit()
+        )
+        recipes = Recipe.objects.with_related().with_user_flags(
+            request.user
+        ).in_bulk([pk for pk, _, _ in ranked])
+        results = []
+        for pk, matched, total in ranked:
+            recipe = recipes.get(pk)
+            if recipe is None:
+                continue
+            recipe.coverage = round(matched / total, 4)
+            recipe.missing_count = total - matched
+            results.append(recipe)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
+    @action(permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS,
             methods=['GET'],
             detail=False)
     def download_shopping_cart(self, request):
-        text = TITLE
-        user = request.user
-        ingredients = Recipe.objects.filter(
-            shopping_cart_recipe__user=user
-        ).values('ingredients__name',
-                 'ingredients__measurement_unit').annotate(
-                     amount=Sum('amount_recipe__amount'))
-
-        ingredients_list = {}
-        for ingredient in ingredients:
-            key = (f'{ingredient["ingredients__name"]}, '
-                   f'{ingredient["ingredients__measurement_unit"]}')
-            if key in ingredients_list:
-                ingredients_list[key] += ingredient['amount']
-            else:
-                ingredients_list[key] = ingredient['amount']
-
-        text += reduce(
-            lambda x, key:
-            x + '   ' + key + ' -- ' + str(ingredients_list[key]) + '\n',
-            ingredients_list, '')
-
-        response = HttpResponse(text, content_type='text/plain; charset=utf-8')
-        filename = 'shopping_list.txt'
+        """ Список покупок в формате txt, csv, json или pdf
+        (?format=... или заголовок Accept), отдаётся потоком.
+        """
+        renderer = request.accepted_renderer
+        ingredients = ShoppingCartTotal.objects.shopping_list(request.user)
+        response = StreamingHttpResponse(
+            renderer.render_stream(ingredients.iterator()),
+            content_type=renderer.content_type
+        )
+        filename = f'shopping_list.{renderer.format}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CachedListMixin, viewsets.ModelViewSet):
 
     """ Список ингредиентов с возможностью поиска по имени.
     Страница доступна всем пользователям.
@@ -120,11 +205,17 @@ class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_class = IngredientFilter
-    search_field = ('^name',)
     pagination_class = None
+    cache_name = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and not is_postgresql(connection):
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CachedListMixin, viewsets.ModelViewSet):
 
     """ Позволяет устанавливать теги на рецептах.
     Страница доступна всем пользователям.
@@ -134,6 +225,7 @@ class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    cache_name = 'tags'
 
 
 class FavoriteViewSet(CreateListViewSet):
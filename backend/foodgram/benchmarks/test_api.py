@@ -0,0 +1,33 @@
+from itertools import count
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.benchmark import SCENARIOS, scenario_client, send
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', SCENARIOS)
+def test_api(benchmark, bench_data, name):
+    """ Те же сценарии, что у manage.py benchmark_api, через
+    pytest-benchmark: --benchmark-json сохраняет замеры вместе
+    с размером данных и числом запросов к базе для сравнения.
+    """
+    client, context = scenario_client()
+    method, path, data = SCENARIOS[name](context)
+    runs = count()
+    queries = []
+
+    def request():
+        with CaptureQueriesContext(connection) as captured:
+            response = send(client, method, path, data, next(runs))
+        queries.append(len(captured.captured_queries))
+        return response
+
+    response = benchmark(request)
+    assert response.status_code < 400, response.content
+    benchmark.extra_info.update(
+        vendor=connection.vendor, sizes=bench_data,
+        queries_min=min(queries), queries_max=max(queries),
+    )
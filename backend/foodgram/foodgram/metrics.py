@@ -0,0 +1,216 @@
+import hmac
+import logging
+import random
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock, local
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.lock = Lock()
+        self.series = defaultdict(
+            lambda: {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+        )
+
+    def observe(self, view, value):
+        with self.lock:
+            series = self.series[view]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help_text}',
+                 f'# TYPE {self.name} histogram']
+        with self.lock:
+            for view, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['buckets']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{view="{view}",'
+                                 f'le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{view="{view}",'
+                             f'le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{view="{view}"}} '
+                             f'{series["sum"]}')
+                lines.append(f'{self.name}_count{{view="{view}"}} '
+                             f'{series["count"]}')
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Total request latency.', LATENCY_BUCKETS
+)
+DB_DURATION = Histogram(
+    'foodgram_db_duration_seconds',
+    'Time spent in database queries per request.', LATENCY_BUCKETS
+)
+SERIALIZE_DURATION = Histogram(
+    'foodgram_serialize_duration_seconds',
+    'Time spent in serializer to_representation.', LATENCY_BUCKETS
+)
+RENDER_DURATION = Histogram(
+    'foodgram_render_duration_seconds',
+    'Time spent rendering the response body.', LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries',
+    'Number of database queries per request.', QUERY_BUCKETS
+)
+HISTOGRAMS = (REQUEST_DURATION, DB_DURATION, SERIALIZE_DURATION,
+              RENDER_DURATION, DB_QUERIES)
+
+_current = local()
+
+
+def view_name(view_func):
+    """ Имя представления вида RecipeViewSet.list для viewset'ов DRF. """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+    return cls.__name__
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.serializing = False
+        self.serialize_time = 0
+        self.render_started = None
+        self.render_time = 0
+        self.view = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += perf_counter() - started
+
+    def rendered(self, response):
+        self.render_time = perf_counter() - self.render_started
+
+
+class SerializationTimingMixin:
+    """ Время to_representation сериализатора попадает в метрики
+    текущего запроса. Вложенные сериализаторы отдельно не считаются:
+    их время входит во время внешнего.
+    """
+
+    def to_representation(self, instance):
+        metrics = getattr(_current, 'metrics', None)
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        started = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serialize_time += perf_counter() - started
+            metrics.serializing = False
+
+
+class MetricsMiddleware:
+    """ Считает запросы к базе, время в базе, время сериализации
+    (см. SerializationTimingMixin), время рендеринга ответа
+    и общее время для каждого действия DRF и проверяет бюджеты
+    QUERY_BUDGETS. Запросы, выполненные при отдаче потокового ответа,
+    не учитываются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        metrics = request.metrics = RequestMetrics()
+        started = perf_counter()
+        _current.metrics = metrics
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.metrics = None
+        if metrics.view is not None:
+            self.record(metrics, perf_counter() - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is None:
+            return
+        metrics.view = view_name(view_func)
+        actions = getattr(view_func, 'actions', None)
+        if actions:
+            action = actions.get(request.method.lower())
+            if action:
+                metrics.view = f'{metrics.view}.{action}'
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.render_started = perf_counter()
+            response.add_post_render_callback(metrics.rendered)
+        return response
+
+    def record(self, metrics, total):
+        REQUEST_DURATION.observe(metrics.view, total)
+        DB_DURATION.observe(metrics.view, metrics.db_time)
+        SERIALIZE_DURATION.observe(metrics.view, metrics.serialize_time)
+        RENDER_DURATION.observe(metrics.view, metrics.render_time)
+        DB_QUERIES.observe(metrics.view, metrics.queries)
+
+        budget = settings.QUERY_BUDGETS.get(metrics.view)
+        if budget is not None and metrics.queries > budget:
+            message = (f'{metrics.view} made {metrics.queries} queries, '
+                       f'budget is {budget}')
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+def metrics_allowed(request):
+    """ Метрики отдаются адресам из METRICS_ALLOWED_IPS
+    или по заголовку Authorization: Bearer METRICS_TOKEN.
+    """
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(
+        header.encode(), f'Bearer {token}'.encode()
+    )
+
+
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return HttpResponse('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4')
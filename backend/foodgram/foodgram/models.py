@@ -0,0 +1,20 @@
+class DenormalizedFieldsMixin:
+    """ Полное сохранение существующей строки не перезаписывает поля
+    denormalized_fields: их меняют только атомарные UPDATE, и в объекте
+    могут быть устаревшие значения.
+    """
+
+    denormalized_fields = ()
+
+    def default_update_fields(self):
+        """ Поля, которые пишет save() без update_fields. """
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.name not in self.denormalized_fields
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = self.default_update_fields()
+        return super().save(*args, **kwargs)
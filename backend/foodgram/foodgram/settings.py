@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +70,35 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    # Ответы анонимам. Счётчики (favorites_count) в них устаревают
+    # не дольше чем на TIMEOUT: избранное не сбрасывает кэш. Списки
+    # с сортировкой по счётчику (?ordering=-favorites_count) не кэшируются.
+    # В LocMemCache ответы и их сброс у каждого процесса свои: правка
+    # в одном воркере доходит до других не позже чем через TIMEOUT.
+    # Общий бэкенд (memcached) сбрасывает ответы сразу во всех.
+    'responses': {
+        'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', default='responses'),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', default=300)),
+    },
+    # Версии наборов данных: по ним процессы сбрасывают свои кэши
+    # и индексы, поэтому хранилище должно быть общим для всех
+    # процессов (см. api/checks.py). Таблицу создаёт миграция api.0014.
+    'versions': {
+        'BACKEND': os.getenv('VERSION_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('VERSION_CACHE_LOCATION', default='foodgram_versions'),
+        'TIMEOUT': None,
+    },
+}
+
+RESPONSE_CACHE_ALIAS = 'responses'
+VERSION_CACHE_ALIAS = 'versions'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -99,8 +130,52 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'api.storage.ContentHashStorage'
+
 AUTH_USER_MODEL = 'users.User'
 
+# Потоки для фоновых задач (картинки, лента); 0 — выполнять в запросе.
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', default=2))
+FEED_RETENTION = 500
+FEED_BACKFILL = 50
+FEED_FANOUT_BATCH_SIZE = 1000
+# Авторы с большим числом подписчиков читаются лентой напрямую.
+FEED_PULL_FOLLOWERS = int(os.getenv('FEED_PULL_FOLLOWERS', default=5000))
+
+# Минимальное триграммное сходство названия ингредиента с запросом
+# (pg_trgm); оператор % дополнительно ограничивает его снизу
+# значением pg_trgm.similarity_threshold (0.3).
+INGREDIENT_TRIGRAM_THRESHOLD = 0.3
+
+# Сколько лучших результатов поиска рецептов берётся без PostgreSQL.
+RECIPE_SEARCH_LIMIT = 1000
+# Подбор рецептов по ингредиентам: размер ответа по умолчанию и предел.
+COOK_RESULTS = 20
+COOK_MAX_RESULTS = 100
+# Индекс подбора рецептов перестраивается целиком, когда изменённых
+# после построения рецептов становится больше этого числа.
+RECIPE_INGREDIENT_INDEX_OVERLAY = 10000
+# Срок хранения журнала изменений ингредиентов рецептов, секунды.
+RECIPE_INGREDIENT_JOURNAL_RETENTION = 24 * 60 * 60
+
+# TrueType-шрифт с кириллицей для списка покупок в PDF.
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_THUMB_SIZE = (400, 400)
+RECIPE_WEBP_SIZE = (1280, 1280)
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', default=10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_MAX_PIXELS', default=25_000_000)
+)
+# base64 длиннее данных на треть, остальное — поля рецепта.
+RECIPE_REQUEST_MAX_BYTES = RECIPE_IMAGE_MAX_BYTES * 4 // 3 + 1024 * 1024
+
 REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -130,11 +205,40 @@ DJOSER = {
     'LOGIN_FIELD': 'email',
 }
 
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', default=1.0))
+# /metrics/ открыт этим адресам (через запятую) и по токену
+# в заголовке Authorization: Bearer <METRICS_TOKEN>.
+METRICS_ALLOWED_IPS = tuple(
+    ip.strip() for ip in os.getenv(
+        'METRICS_ALLOWED_IPS', default='127.0.0.1'
+    ).split(',') if ip.strip()
+)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', default='') == 'True'
+
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 7,
+    'RecipeViewSet.retrieve': 6,
+    'RecipeViewSet.create': 15,
+    'RecipeViewSet.partial_update': 24,
+    'RecipeViewSet.favorite': 8,
+    'RecipeViewSet.shopping_cart': 12,
+    'RecipeViewSet.download_shopping_cart': 2,
+    'RecipeViewSet.feed': 7,
+    'RecipeViewSet.cook': 6,
+    'IngredientViewSet.list': 2,
+    'TagViewSet.list': 2,
+    'UsersViewSet.list': 4,
+    'UsersViewSet.subscriptions': 6,
+    'UsersViewSet.subscribe': 8,
+}
+
 sentry_sdk.init(
     dsn="https://c4bf34f21c04458ab376b703b7724984@o1096073.ingest.sentry.io/6241142",
     integrations=[DjangoIntegration()],
 
-    traces_sample_rate=1.0,
+    traces_sample_rate=float(os.getenv('SENTRY_TRACES_SAMPLE_RATE', default=0.05)),
 
     send_default_pii=True
 )
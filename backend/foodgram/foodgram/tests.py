@@ -0,0 +1,174 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .metrics import DB_QUERIES, SERIALIZE_DURATION
+from api.cache import get_version
+from api.feed import add_author_to_feed
+from api.models import (
+    AmountOfIngredient,
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from api.search import recipe_ingredient_index
+from api.tests import image_base64
+from users.models import Follow
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, BACKGROUND_WORKERS=0,
+                   METRICS_SAMPLE_RATE=1.0, QUERY_BUDGET_RAISE=True)
+class QueryBudgetTest(TestCase):
+
+    """ Каждое действие из QUERY_BUDGETS укладывается в свой бюджет:
+    при превышении MetricsMiddleware бросает QueryBudgetExceeded.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other, cls.star = (
+            User.objects.create_user(
+                username=name, email=f'{name}@foodgram.ru', password='pass',
+                first_name=name, last_name=name,
+            )
+            for name in ('user', 'author', 'other', 'star')
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}',
+                               color=f'#00000{index}')
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(5)
+        ]
+        cls.recipes = []
+        for index in range(8):
+            recipe = Recipe.objects.create(
+                author=(cls.user, cls.author, cls.star)[index % 3],
+                name=f'Рецепт {index}', text='Текст', cooking_time=10,
+                image='recipes/test.png',
+            )
+            recipe.tags.set(cls.tags)
+            AmountOfIngredient.objects.bulk_create(
+                AmountOfIngredient(recipe=recipe, ingredient=ingredient,
+                                   amount=index + 1)
+                for ingredient in cls.ingredients
+            )
+            cls.recipes.append(recipe)
+        for recipe in cls.recipes[:4]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        # Лента сливает разосланные рецепты с рецептами автора
+        # с feed_pull.
+        User.objects.filter(pk=cls.star.pk).update(feed_pull=True)
+        for author in (cls.author, cls.star):
+            Follow.objects.create(user=cls.user, author=author)
+            add_author_to_feed(cls.user.id, author.id)
+        recipe_ingredient_index.ensure_fresh()
+        # Версии создаются один раз, первым запросом; бюджеты —
+        # для установившегося режима.
+        for name in ('ingredients', 'tags'):
+            get_version(name)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def requests(self):
+        own, foreign = self.recipes[0], self.recipes[-1]
+        recipe = {
+            'name': 'Новый рецепт',
+            'text': 'Текст',
+            'cooking_time': 5,
+            'image': image_base64(),
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [{'id': ingredient.id, 'amount': 10}
+                            for ingredient in self.ingredients],
+        }
+        ingredients = '&'.join(
+            f'ingredients={ingredient.id}'
+            for ingredient in self.ingredients[:3]
+        )
+        return (
+            ('RecipeViewSet.list', 'get', '/api/recipes/', None),
+            ('RecipeViewSet.retrieve', 'get',
+             f'/api/recipes/{foreign.id}/', None),
+            ('RecipeViewSet.create', 'post', '/api/recipes/', recipe),
+            ('RecipeViewSet.partial_update', 'patch',
+             f'/api/recipes/{own.id}/', recipe),
+            ('RecipeViewSet.favorite', 'post',
+             f'/api/recipes/{foreign.id}/favorite/', None),
+            ('RecipeViewSet.shopping_cart', 'post',
+             f'/api/recipes/{foreign.id}/shopping_cart/', None),
+            ('RecipeViewSet.download_shopping_cart', 'get',
+             '/api/recipes/download_shopping_cart/', None),
+            ('RecipeViewSet.feed', 'get', '/api/recipes/feed/', None),
+            ('RecipeViewSet.cook', 'get',
+             f'/api/recipes/cook/?{ingredients}', None),
+            ('IngredientViewSet.list', 'get', '/api/ingredients/', None),
+            ('TagViewSet.list', 'get', '/api/tags/', None),
+            ('UsersViewSet.list', 'get', '/api/users/', None),
+            ('UsersViewSet.subscriptions', 'get',
+             '/api/users/subscriptions/', None),
+            ('UsersViewSet.subscribe', 'post',
+             f'/api/users/{self.other.id}/subscribe/', None),
+        )
+
+    def test_budgeted_views_stay_within_budget(self):
+        requests = self.requests()
+        self.assertEqual({view for view, *_ in requests},
+                         set(settings.QUERY_BUDGETS))
+        for view, method, url, data in requests:
+            with self.subTest(view=view):
+                observed = DB_QUERIES.series[view]['count']
+                response = getattr(self.client, method)(
+                    url, data, format='json'
+                )
+                self.assertLess(response.status_code, 400, view)
+                self.assertEqual(DB_QUERIES.series[view]['count'],
+                                 observed + 1)
+
+    def test_serialization_is_timed(self):
+        series = SERIALIZE_DURATION.series['RecipeViewSet.list']
+        spent = series['sum']
+        self.client.get('/api/recipes/')
+        self.assertGreater(series['sum'], spent)
+
+
+@override_settings(METRICS_ALLOWED_IPS=('10.0.0.1',),
+                   METRICS_TOKEN='secret')
+class MetricsViewTest(TestCase):
+
+    """ /metrics/ доступен только с разрешённых адресов или с токеном. """
+
+    def test_allowed_ip(self):
+        response = self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_token(self):
+        response = self.client.get('/metrics/',
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_forbidden(self):
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(headers=headers):
+                response = self.client.get('/metrics/', **headers)
+                self.assertEqual(response.status_code, 403)
@@ -5,3 +5,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+# Индекс подбора рецептов по ингредиентам строится в фоне при запуске
+# процесса, а не в первом запросе к /api/recipes/cook/.
+from api.search import recipe_ingredient_index  # noqa: E402
+from api.tasks import run_in_background  # noqa: E402
+
+run_in_background(recipe_ingredient_index.ensure_fresh)
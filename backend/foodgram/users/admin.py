@@ -6,7 +6,9 @@ from .models import Follow, User
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('pk', 'email', 'username', 'first_name',
-                    'last_name')
+                    'last_name', 'followers_count', 'recipes_count')
+    # Меняются только атомарными UPDATE (см. api/counters.py, api/feed.py).
+    readonly_fields = ('feed_pull', 'followers_count', 'recipes_count')
     list_filter = ('username', 'email')
     empty_value_display = '-пусто-'
 
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20261018_1925'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_pull',
+            field=models.BooleanField(default=False, help_text='Подписчиков слишком много: рецепты автора не рассылаются по лентам, а читаются из них напрямую', verbose_name='Лента без рассылки'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import Follow
+
+
+class SubscriptionsContextMixin:
+    """ Добавляет в контекст сериализатора множество id авторов,
+    на которых подписан текущий пользователь.
+    Множество загружается одним запросом при первом обращении.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        user = self.request.user
+        if user.is_authenticated:
+            if not hasattr(self, '_subscriptions'):
+                self._subscriptions = SimpleLazyObject(
+                    lambda: set(Follow.objects.filter(
+                        user=user
+                    ).values_list('author_id', flat=True))
+                )
+            context['subscriptions'] = self._subscriptions
+        return context
@@ -2,8 +2,10 @@ from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.db import models
 
+from foodgram.models import DenormalizedFieldsMixin
 
-class User(AbstractUser):
+
+class User(DenormalizedFieldsMixin, AbstractUser):
     first_name = models.CharField(
         'Имя',
         max_length=150,
@@ -31,7 +33,26 @@ class User(AbstractUser):
         unique=True,
     )
 
+    feed_pull = models.BooleanField(
+        'Лента без рассылки',
+        default=False,
+        editable=False,
+        help_text='Подписчиков слишком много: рецепты автора не '
+                  'рассылаются по лентам, а читаются из них напрямую',
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчики',
+        default=0,
+        editable=False,
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Рецепты',
+        default=0,
+        editable=False,
+    )
+
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
+    denormalized_fields = ('feed_pull', 'followers_count', 'recipes_count')
 
     class Meta:
         ordering = ['username']
@@ -58,4 +79,10 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='uniq_following')
         ]
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='follow_user_id_idx'),
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
         ordering = ['-id']
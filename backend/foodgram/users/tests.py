@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import Follow
+from api.models import Recipe
+
+User = get_user_model()
+
+SUBSCRIPTIONS_URL = '/api/users/subscriptions/'
+
+
+class SubscriptionsTest(TestCase):
+
+    """ Подписки с recipes_limit отдаются и без авторов на странице. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                username=name, email=f'{name}@foodgram.ru', password='pass',
+            )
+            for name in ('reader', 'author')
+        )
+        for index in range(4):
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/test.png',
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_no_subscriptions(self):
+        response = self.client.get(SUBSCRIPTIONS_URL, {'recipes_limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_page_past_the_end(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        for params, count in (({}, 1), ({'offset': 10}, 0)):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    SUBSCRIPTIONS_URL, {'recipes_limit': 3, **params}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), count)
+                for author in response.data['results']:
+                    self.assertEqual(len(author['recipes']), 3)
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
@@ -6,13 +8,15 @@ from rest_framework.decorators import action
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 
+from .mixins import SubscriptionsContextMixin
 from .models import Follow
 from .serializers import FollowSerializer, UserSerializer
+from api.models import Recipe
 
 User = get_user_model()
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(SubscriptionsContextMixin, UserViewSet):
 
     """
     Предоставляет возможность работать с объектами пользователей:
@@ -26,6 +30,17 @@ class UsersViewSet(UserViewSet):
     serializer_class = UserSerializer
     pagination_class = LimitOffsetPagination
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit', '')
+        if not recipes_limit.isdigit():
+            return None
+        return int(recipes_limit)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['recipes_limit'] = self.get_recipes_limit()
+        return context
+
     @action(permission_classes=[permissions.IsAuthenticated],
             methods=['GET'],
             detail=False)
@@ -37,12 +52,23 @@ class UsersViewSet(UserViewSet):
             methods=['GET'],
             detail=False)
     def subscriptions(self, request):
-        subsriptions = Follow.objects.filter(user=request.user)
-        pages = self.paginate_queryset(subsriptions)
+        authors = User.objects.filter(
+            author__user=request.user
+        ).order_by('-author__id')
+        pages = self.paginate_queryset(authors)
+
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_per_author(
+            [author.id for author in pages], self.get_recipes_limit()
+        ):
+            recipes[recipe.author_id].append(recipe)
+        for author in pages:
+            author.recipes_preview = recipes[author.id]
+
         serializer = FollowSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context=self.get_serializer_context()
         )
         return self.get_paginated_response(serializer.data)
 
@@ -61,10 +87,10 @@ class UsersViewSet(UserViewSet):
             elif author == user:
                 return Response('Нельзя подписаться на самого себя')
 
-            new_sub = Follow.objects.create(
-                user=user, author=author
+            Follow.objects.create(user=user, author=author)
+            serializer = FollowSerializer(
+                author, context=self.get_serializer_context()
             )
-            serializer = FollowSerializer(new_sub)
             return Response(serializer.data,
                             status=status.HTTP_201_CREATED)
 